@@ -0,0 +1,59 @@
+import re
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from ..tokens import count_tokens
+from .rerank import hashed_tf
+
+# prose is split into sentences, everything else line by line
+PROSE_EXTS = {".txt", ".md", ".pdf", ".html", ".htm"}
+_SENTENCE_RE = re.compile(r"(?<=[.!?。])\s+|\n+")
+
+def _units(ctx: Dict[str, str]) -> List[str]:
+    chunk = ctx.get("chunk", "")
+    if Path(ctx.get("source", "")).suffix.lower() in PROSE_EXTS:
+        parts = _SENTENCE_RE.split(chunk)
+    else:
+        parts = chunk.splitlines()
+    return [p for p in parts if p.strip()]
+
+def compress_contexts(question: str, ctxs: List[Dict[str, str]], ratio: float) -> List[Dict[str, str]]:
+    """Keep the sentences / code lines most similar to the question, about `ratio` of the tokens.
+
+    Scoring is a single matrix-vector product over hashed term vectors; no LLM call.
+    Kept units stay in their original order, with "..." marking dropped runs.
+    """
+    if ratio >= 1.0 or not ctxs or not question.strip():
+        return ctxs
+    units: List[str] = []
+    owner: List[int] = []
+    for i, c in enumerate(ctxs):
+        us = _units(c)
+        units.extend(us)
+        owner.extend([i] * len(us))
+    if not units:
+        return ctxs
+
+    scores = hashed_tf(units) @ hashed_tf([question])[0]
+    lengths = np.fromiter((count_tokens(u) for u in units), dtype=np.int64, count=len(units))
+    order = np.argsort(-scores, kind="stable")
+    keep_n = int(np.searchsorted(np.cumsum(lengths[order]), ratio * lengths.sum())) + 1
+    keep = np.zeros(len(units), dtype=bool)
+    keep[order[:keep_n]] = True
+
+    owner_arr = np.asarray(owner)
+    out: List[Dict[str, str]] = []
+    for i, c in enumerate(ctxs):
+        idx = np.nonzero(keep & (owner_arr == i))[0]
+        if len(idx) == 0:
+            continue
+        first = int(np.nonzero(owner_arr == i)[0][0])
+        pieces: List[str] = []
+        prev = first - 1
+        for j in idx:
+            if j != prev + 1:
+                pieces.append("...")
+            pieces.append(units[j])
+            prev = j
+        out.append({**c, "chunk": "\n".join(pieces)})
+    return out
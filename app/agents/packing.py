@@ -0,0 +1,56 @@
+from typing import Dict, List
+from ..tokens import count_tokens, truncate_tokens
+from .tools.file_search import CHUNK_OVERLAP
+
+# below this many tokens a truncated trailing span is not worth including
+_MIN_PARTIAL_TOKENS = 64
+
+def _join_adjacent(a: str, b: str) -> str | None:
+    """One span covering a and b without the shared window overlap, if they are neighbours."""
+    for first, second in ((a, b), (b, a)):
+        tail = first[-CHUNK_OVERLAP:]
+        if tail and second.startswith(tail):
+            return first + second[len(tail):]
+    return None
+
+def merge_adjacent(ctxs: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Merge consecutive chunks of the same file into single spans (score = best of the parts)."""
+    spans = [dict(c) for c in sorted(ctxs, key=lambda x: float(x.get("score", 0)), reverse=True)]
+    merged = True
+    while merged:
+        merged = False
+        for i, s in enumerate(spans):
+            for j in range(i + 1, len(spans)):
+                t = spans[j]
+                if t.get("source") != s.get("source"):
+                    continue
+                if t["chunk"] in s["chunk"]:
+                    joined = s["chunk"]
+                else:
+                    joined = _join_adjacent(s["chunk"], t["chunk"])
+                if joined is not None:
+                    s["chunk"] = joined
+                    del spans[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return spans
+
+def pack_contexts(ctxs: List[Dict[str, str]], budget: int) -> str:
+    """Fill up to `budget` tokens with context spans in score order."""
+    parts: List[str] = []
+    remaining = budget
+    for s in merge_adjacent(ctxs):
+        header = f"[{s['source']}] score={s['score']}\n"
+        block = header + s["chunk"]
+        cost = count_tokens(block) + 2  # blank-line separator
+        if cost <= remaining:
+            parts.append(block)
+            remaining -= cost
+            continue
+        if remaining >= _MIN_PARTIAL_TOKENS:
+            body = truncate_tokens(s["chunk"], remaining - count_tokens(header) - 4)
+            parts.append(header + body + "...")
+        break
+    return "\n\n".join(parts) if parts else "(no context found)"
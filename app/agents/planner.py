@@ -13,5 +13,6 @@ def plan(state: AgentState) -> AgentState:
     steps.append("5) Draft answer using LLM + contexts + tool results")
     steps.append("6) Self-critique & return")
     state["plan"] = steps
-    state["need_rag"] = len(q) > 3
+    # callers may pre-set need_rag=False to skip retrieval
+    state["need_rag"] = state.get("need_rag", True) and len(q) > 3
     return state
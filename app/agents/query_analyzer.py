@@ -6,4 +6,7 @@ def analyze(state: AgentState) -> AgentState:
     state["need_calc"] = bool(re.search(r"\d+\s*[+\-*/^]\s*\d+", q))
     # keep sqlite toggle so UI stays compatible
     state["use_sqlite"] = any(w in q.lower() for w in ["sql:", "query:"])
+    wants_exec = any(w in q.lower() for w in ["python:", "java:"])
+    # callers may pre-set need_tools=False to disable tools entirely
+    state["need_tools"] = state.get("need_tools", True) and (state["need_calc"] or state["use_sqlite"] or wants_exec)
     return state
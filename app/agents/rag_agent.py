@@ -1,49 +1,218 @@
+import asyncio
+import re
+import threading
+from typing import Any, Dict, List, Tuple
 from .state import AgentState
-from ..llm import LLMClient
+from ..routing import llm_router
+from ..cache import LRUCache
+from ..embeddings import EmbeddingClient
 from ..vectorstore.faiss_store import FaissStore
 from .tools.file_search import LocalBM25
-from ..config import DATA_DIR
+from .rerank import mmr_rerank
+from ..ingest import index_version
+from ..metrics import record_cache, record_candidates, record_degraded
+from ..deadline import has_budget, stage_timeout
+from ..config import (
+    DATA_DIR, REWRITE_CACHE_SIZE, REWRITE_CACHE_TTL, REWRITE_MIN_WORDS,
+    RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_MAX_BYTES, MMR_ENABLED, MMR_LAMBDA, RETRIEVAL_TOP_K,
+    DEADLINE_REWRITE_MIN, DEADLINE_REPORT_RESERVE,
+)
+
+# the report agent packs these into its token budget, so hand it a few spare candidates
+TOP_K = RETRIEVAL_TOP_K
+FETCH_K = RETRIEVAL_TOP_K + 2
 
 _bm25 = None
+_bm25_version = None
+_bm25_lock = threading.Lock()
 def _bm25_index():
-    global _bm25
-    if _bm25 is None:
-        _bm25 = LocalBM25(DATA_DIR)
-        _bm25.index()
-    return _bm25
-
-def _rewrite(query: str) -> str:
-    llm = LLMClient()
+    global _bm25, _bm25_version
+    version = index_version()
+    if _bm25 is not None and _bm25_version == version:
+        return _bm25
+    # searches run on threadpool workers: after an upload only one of them rebuilds
+    with _bm25_lock:
+        if _bm25 is None or _bm25_version != version:
+            bm25 = LocalBM25(DATA_DIR)
+            bm25.index()
+            _bm25, _bm25_version = bm25, version
+        return _bm25
+
+_store = None
+_store_version = None
+_store_lock = threading.Lock()
+def _faiss_store() -> FaissStore:
+    """Shared, loaded vector store; reloaded once per index version (warm-up loads the first one)."""
+    global _store, _store_version
+    version = index_version()
+    if _store is not None and _store_version == version:
+        return _store
+    with _store_lock:
+        if _store is None or _store_version != version:
+            store = FaissStore()
+            store.load()
+            _store, _store_version = store, version
+        return _store
+
+_rewrite_cache = LRUCache(max_entries=REWRITE_CACHE_SIZE, ttl=REWRITE_CACHE_TTL)
+_rewrite_skipped = 0
+# identifiers, dotted names and paths: FaissStore.search, snake_case, app/llm.py, Foo#bar
+_IDENT_RE = re.compile(r"^[A-Za-z_][\w.:/#\-]*(\(\))?$")
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split()).strip(" ?!.")
+
+def _should_rewrite(query: str) -> bool:
+    words = query.split()
+    if len(words) < REWRITE_MIN_WORDS:
+        return False
+    if all(_IDENT_RE.match(w) and not w.isalpha() for w in words):
+        return False
+    return True
+
+async def _rewrite(query: str) -> Tuple[str, bool]:
+    """(search query, whether it is the query's usual rewrite): False when the LLM call failed,
+    so retrieval results for the raw query are not cached in place of the rewritten ones."""
+    global _rewrite_skipped
+    if not _should_rewrite(query):
+        _rewrite_skipped += 1
+        record_cache("rewrite", "skip")
+        return query, True
+    key = _normalize(query)
+    cached = _rewrite_cache.get(key)
+    if cached is not None:
+        record_cache("rewrite", "hit")
+        return cached, True
+    record_cache("rewrite", "miss")
+    llm = llm_router
     msg = [{"role":"user","content":f"Rephrase or expand the search query focusing on key technical terms: {query}"}]
     try:
-        return llm.chat(msg, system="You improve search queries for code RAG. Keep it short.") or query
+        rq = await llm.achat(msg, system="You improve search queries for code RAG. Keep it short.", site="query_rewrite") or query
     except Exception:
-        return query
+        return query, False
+    _rewrite_cache.set(key, rq)
+    return rq, True
 
-def retrieve(state: AgentState) -> AgentState:
-    if not state.get("need_rag"):
-        state["contexts"] = []; return state
-    q = state.get("question","")
-    rq = _rewrite(q)
+def rewrite_stats() -> dict:
+    stats = _rewrite_cache.stats()
+    stats["skipped"] = _rewrite_skipped
+    total = stats["hits"] + stats["misses"] + _rewrite_skipped
+    # share of queries that avoided the LLM round-trip (cache hit or skipped)
+    stats["llm_avoided_rate"] = round((stats["hits"] + _rewrite_skipped) / total, 4) if total else 0.0
+    return stats
+
+def _contexts_size(ctxs) -> int:
+    return sum(len(c.get("chunk", "")) + len(c.get("source", "")) + 64 for c in ctxs)
+
+# fused context lists keyed by (normalized query, k, index version);
+# a new index version simply stops matching old keys, which then age out via LRU
+_retrieval_cache = LRUCache(
+    max_entries=RETRIEVAL_CACHE_SIZE,
+    max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+    sizeof=_contexts_size,
+)
 
-    fs = FaissStore()
-    ctx_vec = fs.search(rq or q, k=7)
+def retrieval_stats() -> dict:
+    return _retrieval_cache.stats()
 
+async def _search(query: str, timeout: float | None = None):
+    """Vector (embedding call + FAISS) and BM25 search side by side on the threadpool.
+    If the timeout hits, keep whichever side finished; the third value says whether both did."""
+    vec = asyncio.ensure_future(asyncio.to_thread(lambda: _faiss_store().search(query, k=FETCH_K)))
+    kw = asyncio.ensure_future(asyncio.to_thread(lambda: _bm25_index().search(query, k=FETCH_K)))
+    done, pending = await asyncio.wait({vec, kw}, timeout=timeout)
+    for t in pending:
+        t.cancel()  # the worker thread runs to completion; its result is dropped
+    ctx_vec = vec.result() if vec in done else []
+    ctx_kw = kw.result() if kw in done else []
+    return ctx_vec, ctx_kw, not pending
+
+_embedder: EmbeddingClient | None = None
+def _embedding_client() -> EmbeddingClient:
+    global _embedder
+    if _embedder is None:
+        _embedder = EmbeddingClient()
+    return _embedder
+
+def _search_many(queries: List[str]):
+    # blocking: one embedding call for all queries, one FAISS matrix search, BM25 per query
+    fs = _faiss_store()
+    if fs.index is None and not fs.is_mock:
+        # empty index: nothing to match, so skip the embedding round-trip
+        vec_hits = [[] for _ in queries]
+    else:
+        vec_hits = fs.search_vectors(_embedding_client().embed(queries), k=FETCH_K)
     bm25 = _bm25_index()
-    ctx_kw = bm25.search(rq or q, k=7)
-
-    def norm(items):
-        if not items: return []
-        vals = [float(i.get("score",0)) for i in items]
-        lo, hi = (min(vals), max(vals)) if vals else (0.0, 1.0)
-        out=[]
-        for it in items:
-            s = float(it.get("score",0))
-            ns = (s-lo)/(hi-lo+1e-9)
-            out.append({**it,"score":f"{ns:.4f}"})
-        return out
-
-    fused = norm(ctx_vec) + norm(ctx_kw)
+    return [(vh, bm25.search(q, k=FETCH_K)) for vh, q in zip(vec_hits, queries)]
+
+def _norm(items):
+    if not items: return []
+    vals = [float(i.get("score",0)) for i in items]
+    lo, hi = (min(vals), max(vals)) if vals else (0.0, 1.0)
+    out=[]
+    for it in items:
+        s = float(it.get("score",0))
+        ns = (s-lo)/(hi-lo+1e-9)
+        out.append({**it,"score":f"{ns:.4f}"})
+    return out
+
+def _fuse(ctx_vec, ctx_kw):
+    record_candidates("vector", len(ctx_vec))
+    record_candidates("keyword", len(ctx_kw))
+    fused = _norm(ctx_vec) + _norm(ctx_kw)
     fused.sort(key=lambda x: float(x["score"]), reverse=True)
-    state["contexts"] = fused[:5]
+    if MMR_ENABLED:
+        # overlapping windows of one file otherwise crowd out other evidence
+        return mmr_rerank(fused, TOP_K, MMR_LAMBDA)
+    return fused[:TOP_K]
+
+async def retrieve(state: AgentState) -> AgentState:
+    if not state.get("need_rag"):
+        state["contexts"] = []; return state
+    if state.get("contexts_prefetched"):
+        return state
+    q = state.get("question","")
+    key = (_normalize(q), TOP_K, index_version())
+    cached = _retrieval_cache.get(key)
+    if cached is not None:
+        record_cache("retrieval", "hit")
+        state["contexts"] = list(cached)
+        return state
+    record_cache("retrieval", "miss")
+    deadline = state.get("deadline")
+    if not state.get("skip_rewrite") and has_budget(DEADLINE_REWRITE_MIN, deadline):
+        rq, usual = await _rewrite(q)
+    else:
+        rq = q
+        usual = not _should_rewrite(q)  # only a query that would not be rewritten anyway
+        record_degraded("rewrite")
+
+    # leave enough of the deadline for the draft answer
+    ctx_vec, ctx_kw, complete = await _search(rq or q, stage_timeout(DEADLINE_REPORT_RESERVE, deadline))
+    state["contexts"] = _fuse(ctx_vec, ctx_kw)
+    record_candidates("selected", len(state["contexts"]))
+    if not complete:
+        record_degraded("retrieval")
+    elif usual:
+        _retrieval_cache.set(key, tuple(state["contexts"]))
     return state
+
+async def retrieve_batch(questions: List[str], rewrite: bool = True) -> List[List[Dict[str, Any]]]:
+    """Contexts for many questions at once; cache misses share one embedding call and one vector search.
+    Rewrites run concurrently, so callers bound the batch size."""
+    version = index_version()
+    keys = [(_normalize(q), TOP_K, version) for q in questions]
+    results: List[Any] = [_retrieval_cache.get(k) for k in keys]
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        if rewrite:
+            rewritten = await asyncio.gather(*(_rewrite(questions[i]) for i in misses))
+        else:
+            rewritten = [(questions[i], not _should_rewrite(questions[i])) for i in misses]
+        queries = [rq or questions[i] for (rq, _), i in zip(rewritten, misses)]
+        hits = await asyncio.to_thread(_search_many, queries)
+        for i, (_, usual), (ctx_vec, ctx_kw) in zip(misses, rewritten, hits):
+            results[i] = tuple(_fuse(ctx_vec, ctx_kw))
+            if usual:
+                _retrieval_cache.set(keys[i], results[i])
+    return [list(r) for r in results]
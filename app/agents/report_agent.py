@@ -1,53 +1,193 @@
-from typing import List, Dict
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, List, Dict, Tuple
 from .state import AgentState
-from ..llm import LLMClient
+from ..routing import llm_router
+from ..config import CONTEXT_TOKEN_BUDGET, CONTEXT_COMPRESSION_RATIO, CRITIC_POLICY, ANSWER_MODE, DEADLINE_CRITIC_MIN
+from ..metrics import metrics, record_degraded
+from ..deadline import has_budget
+from .packing import merge_adjacent, pack_contexts
+from .compress import compress_contexts
+from .validator import validate_answer, unsupported_ratio
 SYSTEM = "You are a helpful, concise assistant. Use retrieved snippets to justify answers with short citations (file names)."
+CRITIC_GUIDANCE = "Be precise, actionable, concise."
+ANSWER_INSTRUCTION = "Write a final, self-contained answer. If you used context, mention the file names where appropriate."
+# single_pass / adaptive: the critic's checklist folded into the draft prompt
+SELF_CHECK_INSTRUCTION = (
+    "Write a final, self-contained answer. Before answering, silently check it against the context:\n"
+    "1) drop or qualify any claim the context and tool results do not support\n"
+    "2) cite the file for each claim taken from context, like (File.java)\n"
+    "3) make implementation steps concrete\n"
+    "Return only the checked final answer."
+)
+_RATIO_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
 
-def _format_context(ctxs: List[Dict[str, str]], max_chars=800) -> str:
-    parts = []
-    for c in ctxs[:5]:
-        chunk = c["chunk"]
-        if len(chunk) > max_chars:
-            chunk = chunk[:max_chars] + "..."
-        parts.append(f"[{c['source']}] score={c['score']}\n{chunk}")
-    return "\n\n".join(parts) if parts else "(no context found)"
-
-def _critic_fix(draft: str, context_text: str) -> str:
-    llm = LLMClient()
-    msgs = [
+def _format_context(ctxs: List[Dict[str, str]], question: str = "", budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    # merge on raw chunks (needs the window overlap), then compress, then fill the budget
+    spans = compress_contexts(question, merge_adjacent(ctxs), CONTEXT_COMPRESSION_RATIO)
+    return pack_contexts(spans, budget)
+
+def _draft_messages(state: AgentState, context_text: str, instruction: str = ANSWER_INSTRUCTION) -> List[Dict[str, str]]:
+    # system + context is the same for a query's draft and critic calls: keep it as the prefix so
+    # provider-side prompt caching reuses it, and put per-request parts (plan, question) last
+    q = state.get("question", "")
+    tools = state.get("tool_results", {})
+    tool_text = "\n".join(f"{k}: {v}" for k, v in tools.items()) if tools else "(no tools used)"
+    return [
+        {"role": "assistant", "content": f"Context:\n{context_text}"},
+        {"role": "assistant", "content": f"Tool results:\n{tool_text}"},
+        {"role": "user", "content": instruction},
+        {"role": "assistant", "content": f"Plan: {'; '.join(state.get('plan', []))}"},
+        {"role": "user", "content": f"Question: {q}"},
+    ]
+
+def _critic_messages(draft: str, context_text: str) -> List[Dict[str, str]]:
+    # sent with the draft's system prompt so the system + context prefix is shared
+    return [
+        {"role":"assistant","content":f"Context:\n{context_text}"},
         {"role":"user","content":(
-            "You are a strict reviewer. Check the following answer for:\n"
+            f"{CRITIC_GUIDANCE} You are a strict reviewer. Check the following answer for:\n"
             "1) factual claims unsupported by provided context\n"
             "2) missing citations to files\n"
             "3) unclear steps to implement\n"
             "Return an improved final answer (concise), adding file citations like (File.java)."
         )},
-        {"role":"assistant","content":f"Context:\n{context_text}"},
         {"role":"assistant","content":f"Draft:\n{draft}"},
         {"role":"user","content":"Return just the improved answer."}
     ]
+
+async def _critic_fix(draft: str, context_text: str) -> str:
+    llm = llm_router
     try:
-        return llm.chat(msgs, system="Be precise, actionable, concise.")
+        return await llm.achat(_critic_messages(draft, context_text), system=SYSTEM, site="report_critic")
     except Exception:
         return draft
 
-def draft_and_refine(state: AgentState) -> AgentState:
-    llm = LLMClient()
-    q = state.get("question", "")
-    ctxs = state.get("contexts", [])
-    tools = state.get("tool_results", {})
+def _should_critique(ctxs: List[Dict[str, str]]) -> bool:
+    if CRITIC_POLICY == "never":
+        return False
+    if CRITIC_POLICY == "with_context":
+        # the critic checks claims and citations against context; nothing to check without it
+        return bool(ctxs)
+    return True
 
-    context_text = _format_context(ctxs)
-    tool_text = "\\n".join(f"{k}: {v}" for k, v in tools.items()) if tools else "(no tools used)"
+def _answer_mode() -> str:
+    return ANSWER_MODE if ANSWER_MODE in ("single_pass", "adaptive") else "two_pass"
 
-    messages = [
-        {"role": "user", "content": f"Question: {q}"},
-        {"role": "assistant", "content": f"Plan: {'; '.join(state.get('plan', []))}"},
-        {"role": "assistant", "content": f"Context:\\n{context_text}"},
-        {"role": "assistant", "content": f"Tool results:\\n{tool_text}"},
-        {"role": "user", "content": "Write a final, self-contained answer. If you used context, mention the file names where appropriate."},
-    ]
-    draft = llm.chat(messages, system=SYSTEM)
-    improved = _critic_fix(draft, context_text)
+def _needs_critic(mode: str, draft: str, ctxs: List[Dict[str, str]]) -> Tuple[bool, List[str]]:
+    """two_pass follows CRITIC_POLICY; adaptive runs the critic only when the cheap validator objects."""
+    if mode == "single_pass":
+        return False, []
+    if mode == "adaptive":
+        issues = validate_answer(draft, ctxs)
+        metrics.incr(f"report.adaptive.validator_{'fail' if issues else 'pass'}")
+        for issue in issues:
+            metrics.incr(f"report.adaptive.issue.{issue}")
+        return bool(issues), issues
+    return _should_critique(ctxs), []
+
+def _critic_in_budget(critic: bool, state: AgentState) -> bool:
+    # skipped under load shedding or when the deadline leaves no room for a second call
+    if critic and (state.get("skip_critic") or not has_budget(DEADLINE_CRITIC_MIN, state.get("deadline"))):
+        record_degraded("critic")
+        return False
+    return critic
+
+def _timed_out_answer(ctxs: List[Dict[str, str]]) -> str:
+    sources = list(dict.fromkeys(c.get("source", "") for c in ctxs if c.get("source")))
+    text = "The answer could not be generated within the time limit."
+    return text + (" Relevant files: " + ", ".join(sources) if sources else "")
+
+def _record(state: AgentState, mode: str, started: float, critic: bool, issues: List[str]) -> None:
+    # latency plus a validator-based quality proxy of the final answer, comparable across modes
+    ctxs = state.get("contexts", [])
+    final = state.get("final", "")
+    metrics.observe(f"report.{mode}.seconds", time.perf_counter() - started)
+    metrics.incr(f"report.{mode}.answers")
+    if critic:
+        metrics.incr(f"report.{mode}.critic_runs")
+    if ctxs:
+        metrics.observe(f"report.{mode}.unsupported_ratio", unsupported_ratio(final, ctxs), _RATIO_BUCKETS)
+        if "missing_citations" in validate_answer(final, ctxs):
+            metrics.incr(f"report.{mode}.uncited")
+    trace = state.get("metrics")
+    if trace is not None:
+        trace["report"] = {"mode": mode, "critic": critic, "issues": issues}
+
+async def draft_and_refine(state: AgentState) -> AgentState:
+    llm = llm_router
+    mode = _answer_mode()
+    started = time.perf_counter()
+    ctxs = state.get("contexts", [])
+    # built once; the critic pass reuses the same compressed context
+    context_text = _format_context(ctxs, state.get("question", ""))
+    instruction = ANSWER_INSTRUCTION if mode == "two_pass" else SELF_CHECK_INSTRUCTION
+    try:
+        draft = await llm.achat(_draft_messages(state, context_text, instruction), system=SYSTEM, site="report_draft")
+    except Exception:
+        if has_budget(0, state.get("deadline")):
+            raise
+        # deadline hit mid-draft: return what retrieval found instead of an error
+        record_degraded("draft")
+        state["draft"] = state["final"] = _timed_out_answer(ctxs)
+        _record(state, mode, started, False, [])
+        return state
+    state["draft"] = draft
+    critic, issues = _needs_critic(mode, draft, ctxs)
+    critic = _critic_in_budget(critic, state)
+    improved = await _critic_fix(draft, context_text) if critic else None
     state["final"] = improved or draft
+    _record(state, mode, started, critic, issues)
     return state
+
+async def stream_answer(state: AgentState) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming counterpart of draft_and_refine: yields {"phase", "text"} deltas,
+    first for the draft and then (if the critic runs) for the revision. Fills
+    state["draft"] / state["final"] when the generator is exhausted."""
+    llm = llm_router
+    mode = _answer_mode()
+    started = time.perf_counter()
+    ctxs = state.get("contexts", [])
+    context_text = _format_context(ctxs, state.get("question", ""))
+    instruction = ANSWER_INSTRUCTION if mode == "two_pass" else SELF_CHECK_INSTRUCTION
+    deadline = state.get("deadline")
+    parts: List[str] = []
+    try:
+        # aclosing: breaking out (deadline) or being closed (client gone) closes the upstream
+        # stream and frees its limiter slot now, not whenever the generator is collected
+        async with aclosing(llm.astream_chat(_draft_messages(state, context_text, instruction), system=SYSTEM, site="report_draft")) as stream:
+            async for delta in stream:
+                parts.append(delta)
+                yield {"phase": "draft", "text": delta}
+                if not has_budget(0, deadline):
+                    break
+    except Exception:
+        if has_budget(0, deadline):
+            raise
+    if not has_budget(0, deadline):
+        # deadline hit: keep the partial draft (or a fallback) and stop here
+        record_degraded("draft")
+        state["draft"] = state["final"] = "".join(parts) or _timed_out_answer(ctxs)
+        _record(state, mode, started, False, [])
+        return
+    draft = "".join(parts)
+    state["draft"] = state["final"] = draft
+    critic, issues = _needs_critic(mode, draft, ctxs)
+    critic = _critic_in_budget(critic, state)
+    if critic:
+        revised: List[str] = []
+        try:
+            async with aclosing(llm.astream_chat(_critic_messages(draft, context_text), system=SYSTEM, site="report_critic")) as stream:
+                async for delta in stream:
+                    revised.append(delta)
+                    yield {"phase": "revision", "text": delta}
+                    if not has_budget(0, deadline):
+                        break
+            # a revision cut off by the deadline is worse than the complete draft
+            if has_budget(0, deadline):
+                state["final"] = "".join(revised) or draft
+            else:
+                record_degraded("critic")
+        except Exception:
+            pass
+    _record(state, mode, started, critic, issues)
@@ -0,0 +1,50 @@
+import re
+import zlib
+from typing import Any, Dict, List
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+|[^\sA-Za-z0-9_]{2,}|[가-힣]+")
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+def hashed_tf(texts: List[str], dim: int = 4096) -> np.ndarray:
+    """L2-normalized hashed term-frequency vectors, one row per text."""
+    mat = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        idx = [zlib.crc32(t.encode("utf-8")) % dim for t in tokenize(text)]
+        if idx:
+            np.add.at(mat[row], idx, 1.0)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.maximum(norms, 1e-9)
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, k: int, lam: float = 0.5) -> List[int]:
+    """Maximal marginal relevance over candidate rows; returns selected indices in order.
+
+    relevance: (n,) query relevance per candidate; vectors: (n, d) L2-normalized.
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    sim = vectors @ vectors.T
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, n)):
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        scores = lam * relevance - (1.0 - lam) * redundancy
+        scores = np.where(available, scores, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, sim[best])
+    return selected
+
+def mmr_rerank(candidates: List[Dict[str, Any]], k: int, lam: float = 0.5) -> List[Dict[str, Any]]:
+    """Diversify fused contexts: relevance is the fused score, redundancy the
+    similarity of lexical hashed vectors of the chunks."""
+    if len(candidates) <= 1:
+        return candidates[:k]
+    vecs = hashed_tf([c.get("chunk", "") for c in candidates])
+    rel = np.asarray([float(c.get("score", 0)) for c in candidates], dtype=np.float32)
+    return [candidates[i] for i in mmr(rel, vecs, k, lam)]
@@ -6,7 +6,13 @@ class AgentState(TypedDict, total=False):
     need_rag: bool
     need_calc: bool
     use_sqlite: bool
+    need_tools: bool
     contexts: List[Dict[str, str]]
+    contexts_prefetched: bool
     tool_results: Dict[str, Any]
     draft: str
     final: str
+    skip_rewrite: bool  # load shedding: set by the admission controller
+    skip_critic: bool
+    deadline: float  # time.monotonic() by which the answer must be ready
+    metrics: Dict[str, Any]  # per-query trace: timings, llm tokens, cache outcomes, candidate counts
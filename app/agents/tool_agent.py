@@ -1,20 +1,23 @@
+import asyncio
 import re
 from typing import Dict, Any
 from .state import AgentState
 from .tools.calculator import safe_calculate
 from .tools.sqlite_tool import run_sql
 from .tools.exec_tool import run_python, run_javac
+from ..config import DEADLINE_REPORT_RESERVE
+from ..deadline import stage_timeout
+from ..metrics import record_degraded
 
 def _extract_after(prefix: str, q: str) -> str | None:
     idx = q.lower().find(prefix)
     if idx == -1: return None
     return q[idx+len(prefix):].strip()
 
-def exec_tools(state: AgentState) -> AgentState:
-    q = state.get("question", "")
+def _run_tools(q: str, need_calc: bool) -> Dict[str, Any]:
     results: Dict[str, Any] = {}
 
-    if state.get("need_calc"):
+    if need_calc:
         m = re.search(r"(\d+\s*[+\-*/^]\s*\d+(?:\s*[+\-*/^]\s*\d+)*)", q)
         if m:
             expr = m.group(1)
@@ -37,5 +40,15 @@ def exec_tools(state: AgentState) -> AgentState:
     if jv:
         results["java_exec"] = run_javac(jv)
 
-    state["tool_results"] = results
+    return results
+
+async def exec_tools(state: AgentState) -> AgentState:
+    # calculator / sqlite / subprocess tools are sync-only: run them on the threadpool
+    run = asyncio.to_thread(_run_tools, state.get("question", ""), bool(state.get("need_calc")))
+    try:
+        state["tool_results"] = await asyncio.wait_for(run, stage_timeout(DEADLINE_REPORT_RESERVE, state.get("deadline")))
+    except asyncio.TimeoutError:
+        # out of time: answer without tool output rather than not at all
+        record_degraded("tools")
+        state["tool_results"] = {}
     return state
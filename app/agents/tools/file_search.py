@@ -18,7 +18,9 @@ def _read_text(path: Path) -> str:
             return path.read_text(encoding="cp949", errors="ignore")
         except Exception:
             return ""
-def _chunk_text(text: str, chunk_size: int = 1200, overlap: int = 120) -> List[str]:
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 120
+def _chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     tokens = re.split(r"(?<=\n)", text)
     chunks = []
     buff = ""
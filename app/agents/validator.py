@@ -0,0 +1,31 @@
+import re
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from .rerank import hashed_tf
+
+# a sentence whose best lexical match against any context is below this counts as unsupported
+SUPPORT_MIN = 0.2
+# more than this share of unsupported sentences flags the answer
+UNSUPPORTED_MAX = 0.3
+_SENTENCE_RE = re.compile(r"(?<=[.!?。])\s+|\n+")
+
+def unsupported_ratio(answer: str, ctxs: List[Dict[str, str]]) -> float:
+    """Share of substantive answer sentences with no lexical support in the contexts."""
+    sentences = [s for s in _SENTENCE_RE.split(answer) if len(s.split()) >= 4]
+    if not sentences or not ctxs:
+        return 0.0
+    support = (hashed_tf(sentences) @ hashed_tf([c.get("chunk", "") for c in ctxs]).T).max(axis=1)
+    return float(np.mean(support < SUPPORT_MIN))
+
+def validate_answer(answer: str, ctxs: List[Dict[str, str]]) -> List[str]:
+    """Cheap, LLM-free checks of a drafted answer; returns the issues found."""
+    if not ctxs:
+        return []
+    issues: List[str] = []
+    names = {Path(c.get("source", "")).name for c in ctxs}
+    if not any(n and n in answer for n in names):
+        issues.append("missing_citations")
+    if unsupported_ratio(answer, ctxs) > UNSUPPORTED_MAX:
+        issues.append("unsupported_claims")
+    return issues
@@ -12,6 +12,10 @@ class QueryRequest(BaseModel):
     include_context: bool = Field(True, description="컨텍스트 포함 여부")
     include_tools: bool = Field(True, description="도구 실행 여부")
     max_contexts: int = Field(5, description="최대 컨텍스트 수", ge=1, le=20)
+    debug: bool = Field(False, description="노드별 시간 / 토큰 / 캐시 정보 포함 여부")
+    user_id: Optional[str] = Field(None, description="히스토리 기록용 사용자 ID", max_length=100)
+    no_cache: bool = Field(False, description="시맨틱 답변 캐시 우회 여부")
+    timeout: Optional[float] = Field(None, description="처리 시간 한도(초, 기본값: 서버 설정)", gt=0, le=300)
 
 class QueryResponse(BaseModel):
     """쿼리 응답 모델"""
@@ -22,6 +26,17 @@ class QueryResponse(BaseModel):
     plan: List[str] = Field(default_factory=list)
     processing_time: float
     timestamp: datetime = Field(default_factory=datetime.now)
+    debug: Optional[Dict[str, Any]] = None
+
+class BatchQueryRequest(BaseModel):
+    """배치 쿼리 요청 모델"""
+    questions: List[str] = Field(..., description="질문 목록 (중복은 한 번만 처리)", min_length=1, max_length=1000)
+    include_context: bool = Field(True, description="컨텍스트 포함 여부")
+    include_tools: bool = Field(True, description="도구 실행 여부")
+    max_contexts: int = Field(5, description="최대 컨텍스트 수", ge=1, le=20)
+    concurrency: Optional[int] = Field(None, description="동시 실행 질문 수 (기본값: 서버 설정)", ge=1, le=64)
+    timeout: Optional[float] = Field(None, description="질문별 처리 시간 한도(초, 기본값: 서버 설정)", gt=0, le=300)
+    user_id: Optional[str] = Field(None, description="히스토리 기록용 사용자 ID", max_length=100)
 
 class DocumentInfo(BaseModel):
     """문서 정보 모델"""
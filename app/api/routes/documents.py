@@ -13,6 +13,7 @@ from typing import List
 from app.api.models import DocumentInfo, ErrorResponse
 from app.core.config import settings
 from app.core.exceptions import DocumentNotFoundError
+from app.ingest import bump_index_version
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -77,6 +78,9 @@ async def upload_documents(files: List[UploadFile] = File(...)):
             
             logger.info(f"파일 업로드 완료: {file.filename}")
         
+        # 문서가 바뀌었으므로 검색 캐시 무효화
+        bump_index_version()
+        
         return {
             "message": f"{len(uploaded_files)}개 파일이 성공적으로 업로드되었습니다.",
             "uploaded_files": uploaded_files
@@ -136,6 +140,7 @@ async def delete_document(filename: str):
             )
         
         file_path.unlink()
+        bump_index_version()
         
         logger.info(f"파일 삭제 완료: {filename}")
         return {
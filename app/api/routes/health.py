@@ -28,8 +28,8 @@ async def health_check():
         
         # LLM 서비스 상태 확인 (간소화)
         try:
-            from app.llm import LLMClient
-            llm_client = LLMClient()
+            from app.llm import get_llm_client
+            llm_client = get_llm_client()
             if hasattr(llm_client, 'is_mock') and llm_client.is_mock:
                 services["llm"] = "mock_mode"
             else:
@@ -55,6 +55,10 @@ async def health_check():
             services["database"] = "mock_mode"
             logger.warning(f"데이터베이스 mock 모드로 설정: {e}")
         
+        # 어드미션 컨트롤 모드 (normal이 아니면 부하로 품질을 낮춰 응답 중)
+        from app.services.admission import admission
+        services["admission"] = admission.mode
+        
         # 인덱스 상태 확인 (간소화)
         try:
             services["index"] = "available"
@@ -63,7 +67,7 @@ async def health_check():
             logger.warning(f"인덱스 mock 모드로 설정: {e}")
         
         return HealthResponse(
-            status="healthy",
+            status="healthy" if services["admission"] == "normal" else "degraded",
             timestamp=datetime.now(),
             version=getattr(settings, 'VERSION', '2.0.0'),
             services=services
@@ -79,6 +83,18 @@ async def health_check():
             services={"server": "running", "mode": "deployment"}
         )
 
+@router.get("/health/ready")
+async def readiness_check():
+    """레디니스 체크 - 쿼리 서비스 워밍업 완료 전에는 503 (실패했다면 원인 포함)"""
+    from app.services.query_service import get_query_service
+    service = get_query_service()
+    if not service.ready:
+        raise HTTPException(status_code=503, detail={
+            "message": "쿼리 서비스 워밍업 중입니다.",
+            **service.warm_up_stats(),
+        })
+    return {"status": "ready", "timestamp": datetime.now().isoformat()}
+
 @router.get("/health/simple")
 async def simple_health_check():
     """간단한 헬스 체크 (Railway용) - 디버그 정보 포함"""
@@ -157,12 +173,19 @@ async def detailed_health_check():
         # 각 서비스별 상세 정보 수집
         # LLM 서비스
         try:
-            from app.llm import LLMClient
-            llm_client = LLMClient()
+            from app.llm import get_llm_client, llm_pool_stats
+            from app.ratelimit import limiter_stats
+            from app.resilience import breaker_stats
+            from app.routing import llm_router
+            llm_client = get_llm_client()
             health_info["services"]["llm"] = {
                 "status": "mock_mode" if llm_client.is_mock else "connected",
                 "provider": settings.LLM_PROVIDER,
-                "endpoint": settings.AZURE_OPENAI_ENDPOINT
+                "endpoint": settings.AZURE_OPENAI_ENDPOINT,
+                "pool": llm_pool_stats(),
+                "routes": llm_router.routes,
+                "limiters": limiter_stats(),
+                "breakers": breaker_stats()
             }
         except Exception as e:
             health_info["services"]["llm"] = {"status": "error", "error": str(e)}
@@ -196,7 +219,42 @@ async def detailed_health_check():
             }
         except Exception as e:
             health_info["services"]["database"] = {"status": "error", "error": str(e)}
-        
+
+        # 캐시 통계
+        try:
+            from app.agents.rag_agent import rewrite_stats, retrieval_stats
+            from app.services.answer_cache import answer_cache
+            from app.llm_cache import llm_response_cache
+            health_info["caches"] = {
+                "query_rewrite": rewrite_stats(),
+                "retrieval": retrieval_stats(),
+                "answer": answer_cache.stats(),
+                "llm_response": llm_response_cache.stats(),
+            }
+        except Exception as e:
+            health_info["caches"] = {"status": "error", "error": str(e)}
+
+        # 쿼리 히스토리 write-behind 버퍼
+        try:
+            from app.services.query_history import query_history
+            health_info["query_history"] = query_history.stats()
+        except Exception as e:
+            health_info["query_history"] = {"status": "error", "error": str(e)}
+
+        # 쿼리 서비스 워밍업 (실패 시 백그라운드 재시도 중)
+        try:
+            from app.services.query_service import get_query_service
+            health_info["query_service"] = get_query_service().warm_up_stats()
+        except Exception as e:
+            health_info["query_service"] = {"status": "error", "error": str(e)}
+
+        # 어드미션 컨트롤 (모드 / 동시 실행 / 대기열 / 지연 EWMA)
+        try:
+            from app.services.admission import admission
+            health_info["admission"] = admission.stats()
+        except Exception as e:
+            health_info["admission"] = {"status": "error", "error": str(e)}
+
         return health_info
         
     except Exception as e:
@@ -0,0 +1,36 @@
+"""
+메트릭 조회 라우트
+"""
+
+from fastapi import APIRouter
+from datetime import datetime
+import logging
+
+from app.metrics import metrics, llm_site_stats
+from app.routing import llm_router
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/metrics")
+async def get_metrics(prefix: str = ""):
+    """프로세스 메트릭 (노드별 지연 히스토그램, LLM 토큰, 캐시 히트 카운터)
+    
+    prefix로 필터링 가능 (예: node., query., llm., cache.)
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        **metrics.snapshot(prefix)
+    }
+
+@router.get("/metrics/llm")
+async def get_llm_site_metrics():
+    """LLM 호출 위치(site)별 호출 수 / prompt·completion 토큰 / 지연 (총 토큰 내림차순)와 배포 라우팅 현황
+    
+    프롬프트 축소나 응답 캐시(LLM_CACHE_TTLS)를 적용할 호출 위치를 고르는 데 사용
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "sites": llm_site_stats(),
+        "routing": llm_router.stats()
+    }
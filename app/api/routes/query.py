@@ -2,14 +2,20 @@
 쿼리 처리 라우트
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import StreamingResponse
 from datetime import datetime
+import json
 import time
 import logging
+from typing import Optional
 
-from app.api.models import QueryRequest, QueryResponse, ErrorResponse
-from app.core.exceptions import QueryProcessingError, LLMServiceError, ToolExecutionError
-from app.services.query_service import QueryService
+from app.api.models import QueryRequest, QueryResponse, ErrorResponse, BatchQueryRequest
+from app.core.config import settings
+from app.config import QUERY_BATCH_CONCURRENCY
+from app.core.exceptions import QueryProcessingError, LLMServiceError, ToolExecutionError, ServiceOverloadedError
+from app.services.query_service import get_query_service
+from app.services.query_history import query_history
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -22,15 +28,17 @@ async def process_query(request: QueryRequest):
     try:
         logger.info(f"쿼리 처리 시작: {request.question[:100]}...")
         
-        # 쿼리 서비스 인스턴스 생성
-        query_service = QueryService()
+        # 프로세스 전역 쿼리 서비스 (그래프는 시작 시 컴파일됨)
+        query_service = get_query_service()
         
         # 쿼리 처리
         result = await query_service.process_query(
             question=request.question,
             include_context=request.include_context,
             include_tools=request.include_tools,
-            max_contexts=request.max_contexts
+            max_contexts=request.max_contexts,
+            use_cache=not request.no_cache,
+            timeout=request.timeout
         )
         
         processing_time = time.time() - start_time
@@ -42,9 +50,14 @@ async def process_query(request: QueryRequest):
             tool_results=result.get("tool_results", {}),
             plan=result.get("plan", []),
             processing_time=processing_time,
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            debug=result.get("metrics") if request.debug else None
         )
         
+        # 히스토리는 버퍼에만 추가 (DB 기록은 백그라운드에서 배치로)
+        if settings.QUERY_HISTORY_ENABLED:
+            query_history.record(request.question, result, processing_time, request.user_id)
+        
         logger.info(f"쿼리 처리 완료: {processing_time:.2f}초")
         return response
         
@@ -56,7 +69,9 @@ async def process_query(request: QueryRequest):
                 "error": e.error_type,
                 "message": e.message,
                 "details": e.details
-            }
+            },
+            # 과부하 거절은 재시도 시점을 알려줌
+            headers={"Retry-After": str(e.details["retry_after"])} if "retry_after" in e.details else None
         )
     except LLMServiceError as e:
         logger.error(f"LLM 서비스 오류: {e.message}")
@@ -89,21 +104,113 @@ async def process_query(request: QueryRequest):
             }
         )
 
+def _sse(event: str, data) -> str:
+    """Server-Sent Events 프레임"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
 @router.post("/query/stream")
-async def process_query_stream(request: QueryRequest):
-    """스트리밍 쿼리 처리 (향후 구현)"""
-    # TODO: 스트리밍 응답 구현
-    raise HTTPException(
-        status_code=501,
-        detail="스트리밍 기능은 아직 구현되지 않았습니다."
+async def process_query_stream(request: QueryRequest, http_request: Request):
+    """스트리밍 쿼리 처리 (SSE)
+    
+    plan / contexts / tool_results 진행 이벤트 후 답변 토큰(token)을 생성되는 대로 전송하고
+    마지막에 done 이벤트를 보낸다. 클라이언트 연결이 끊기면 LLM 스트림을 닫고 처리를 중단한다.
+    """
+    query_service = get_query_service()
+    
+    async def event_stream():
+        events = query_service.stream_query(
+            question=request.question,
+            include_context=request.include_context,
+            include_tools=request.include_tools,
+            max_contexts=request.max_contexts,
+            timeout=request.timeout
+        )
+        try:
+            async for ev in events:
+                if await http_request.is_disconnected():
+                    logger.info("스트리밍 클라이언트 연결 종료 - 쿼리 처리 중단")
+                    break
+                if ev["event"] == "done":
+                    if settings.QUERY_HISTORY_ENABLED:
+                        query_history.record(request.question, ev["data"]["result"], ev["data"]["processing_time"], request.user_id)
+                    # result는 내부 상태(컨텍스트/트레이스/데드라인 등) - 클라이언트에 보내지 않음
+                    ev = {"event": "done", "data": {k: v for k, v in ev["data"].items() if k != "result"}}
+                yield _sse(ev["event"], ev["data"])
+        except ServiceOverloadedError as e:
+            logger.warning(f"스트리밍 쿼리 거절: {e.details.get('reason')}")
+            yield _sse("error", {"error": e.error_type, "message": e.message, "details": e.details})
+        except QueryProcessingError as e:
+            logger.error(f"스트리밍 쿼리 처리 오류: {e.message}")
+            yield _sse("error", {"error": e.error_type, "message": e.message, "details": e.details})
+        except Exception as e:
+            logger.error(f"스트리밍 쿼리 처리 오류: {e}")
+            yield _sse("error", {"message": "쿼리 처리 중 오류가 발생했습니다", "details": str(e)})
+        finally:
+            # 상위 LLM 스트림까지 닫아 남은 토큰 생성을 취소
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@router.post("/query/batch")
+async def process_query_batch(request: BatchQueryRequest, http_request: Request):
+    """배치 쿼리 처리 (NDJSON 스트리밍)
+    
+    질문별 결과를 완료되는 순서대로 한 줄씩 전송한다. indices는 요청 목록에서의 위치(중복 포함)이다.
+    """
+    query_service = get_query_service()
+    concurrency = request.concurrency or QUERY_BATCH_CONCURRENCY
+    logger.info(f"배치 쿼리 처리 시작: {len(request.questions)}개 질문 (동시성 {concurrency})")
+    
+    async def ndjson_stream():
+        results = query_service.process_batch(
+            questions=request.questions,
+            include_context=request.include_context,
+            include_tools=request.include_tools,
+            max_contexts=request.max_contexts,
+            concurrency=concurrency,
+            timeout=request.timeout
+        )
+        try:
+            async for item in results:
+                if await http_request.is_disconnected():
+                    logger.info("배치 클라이언트 연결 종료 - 남은 질문 취소")
+                    break
+                if settings.QUERY_HISTORY_ENABLED and "answer" in item:
+                    query_history.record(
+                        item["question"],
+                        {"final": item["answer"], "contexts": item["contexts"], "metrics": item.get("metrics")},
+                        item["processing_time"],
+                        request.user_id
+                    )
+                # 쿼리별 트레이스는 히스토리용 - 응답에서는 항상 제거
+                item = {k: v for k, v in item.items() if k != "metrics"}
+                yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            logger.error(f"배치 쿼리 처리 오류: {e}")
+            yield json.dumps({"error": "배치 처리 중 오류가 발생했습니다", "details": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            await results.aclose()
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
 @router.get("/query/history")
-async def get_query_history(limit: int = 10, offset: int = 0):
-    """쿼리 히스토리 조회 (향후 구현)"""
-    # TODO: 쿼리 히스토리 저장 및 조회 구현
-    return {
-        "message": "쿼리 히스토리 기능은 아직 구현되지 않았습니다.",
-        "limit": limit,
-        "offset": offset
-    }
+async def get_query_history(limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None, user_id: Optional[str] = None):
+    """쿼리 히스토리 조회 (최신순, 키셋 페이지네이션)
+    
+    다음 페이지는 응답의 next_cursor를 cursor로 넘겨 요청한다.
+    최근 flush 주기 이내의 쿼리는 아직 보이지 않을 수 있다.
+    """
+    if not settings.QUERY_HISTORY_ENABLED:
+        raise HTTPException(status_code=404, detail="쿼리 히스토리가 비활성화되어 있습니다.")
+    try:
+        page = await query_history.fetch_page(limit=limit, cursor=cursor, user_id=user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="잘못된 cursor 값입니다.")
+    except Exception as e:
+        logger.error(f"쿼리 히스토리 조회 실패: {e}")
+        raise HTTPException(status_code=500, detail=f"쿼리 히스토리 조회 실패: {str(e)}")
+    return {**page, "limit": limit}
@@ -0,0 +1,87 @@
+"""
+프로세스 내 LRU + TTL 캐시
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """스레드 안전한 LRU 캐시 (선택적 TTL / 메모리 상한, 히트율 통계 포함)"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda v: 1)
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            stored_at, value, _ = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.monotonic(), value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self.evictions += 1
+
+    def _pop(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
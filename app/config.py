@@ -12,5 +12,64 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-06-01")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini")
+# cheap/fast deployment for lightweight call sites (empty = everything uses AZURE_OPENAI_DEPLOYMENT)
+AZURE_OPENAI_FAST_DEPLOYMENT = os.getenv("AZURE_OPENAI_FAST_DEPLOYMENT", "")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
 SQLITE_DB = os.getenv("SQLITE_DB", str(BASE_DIR / "data" / "demo.db"))
+# Query rewrite cache / skip heuristics
+REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "1024"))
+REWRITE_CACHE_TTL = float(os.getenv("REWRITE_CACHE_TTL", "3600"))
+REWRITE_MIN_WORDS = int(os.getenv("REWRITE_MIN_WORDS", "4"))
+# Retrieval result cache
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.getenv("RETRIEVAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# MMR diversity re-ranking (1.0 = pure relevance, 0.0 = pure diversity)
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+# Default number of questions of one /query/batch request processed concurrently
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+# Context packing for the report prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Extractive context compression: fraction of context tokens to keep (1.0 = off)
+CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO", "0.6"))
+# When the report agent runs its critic pass: always | never | with_context
+CRITIC_POLICY = os.getenv("CRITIC_POLICY", "with_context").lower()
+# Report answer mode: two_pass (draft + critic per CRITIC_POLICY) | single_pass | adaptive
+ANSWER_MODE = os.getenv("ANSWER_MODE", "two_pass").lower()
+# Request deadline budgets (seconds of remaining time each optional stage needs to run)
+DEADLINE_REWRITE_MIN = float(os.getenv("DEADLINE_REWRITE_MIN", "10"))
+DEADLINE_CRITIC_MIN = float(os.getenv("DEADLINE_CRITIC_MIN", "6"))
+# time kept back for the draft answer when bounding retrieval / tools
+DEADLINE_REPORT_RESERVE = float(os.getenv("DEADLINE_REPORT_RESERVE", "5"))
+# Shared HTTP connection pool for Azure OpenAI (chat + embeddings)
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 multiplexing; only takes effect when the optional `h2` package is installed
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+# Client-side LLM rate limits (match the deployment's Azure quota; 0 = unlimited)
+LLM_RPM = int(os.getenv("LLM_RPM", "360"))
+LLM_TPM = int(os.getenv("LLM_TPM", "60000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# completion tokens assumed when reserving TPM before a call (settled from usage afterwards)
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "512"))
+# per-deployment overrides "deployment=rpm:tpm:concurrency,..." (unlisted deployments use the values above)
+LLM_DEPLOYMENT_LIMITS = os.getenv("LLM_DEPLOYMENT_LIMITS", "")
+# Disk-backed LLM response cache (opt-in per call site: "site=ttl_seconds,...", empty = off)
+LLM_CACHE_TTLS = os.getenv("LLM_CACHE_TTLS", "")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(BASE_DIR / "data" / "llm_cache.db"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# LLM retries (exponential backoff with jitter, Retry-After honored) and circuit breaker
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Hedged requests: send a duplicate once a call exceeds the deployment's p95 latency
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Per-call-site model routing: "site=deployment|fallback|...,..."; "fast" / "main" name the two
+# configured deployments, "*" is the chain for unlisted sites. Later entries are tried when
+# the earlier deployment's breaker is open or its retries are exhausted.
+LLM_ROUTES = os.getenv("LLM_ROUTES", "*=main,classification=fast|main,query_rewrite=fast|main,suggestion=fast|main")
@@ -53,6 +53,22 @@ class QueryProcessingError(AgenticAIException):
             details=details
         )
 
+class QueryTimeoutError(QueryProcessingError):
+    """쿼리 처리 시간 초과"""
+    
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message=message, details=details)
+        self.status_code = 504
+        self.error_type = "QueryTimeoutError"
+
+class ServiceOverloadedError(QueryProcessingError):
+    """과부하로 요청 거절"""
+    
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message=message, details=details)
+        self.status_code = 503
+        self.error_type = "ServiceOverloadedError"
+
 class LLMServiceError(AgenticAIException):
     """LLM 서비스 오류"""
     
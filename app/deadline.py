@@ -0,0 +1,37 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# absolute time.monotonic() deadline of the current query (AgentState["deadline"])
+_current_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
+
+def deadline_after(seconds: float) -> float:
+    return time.monotonic() + seconds
+
+def bind_deadline(deadline: Optional[float]):
+    return _current_deadline.set(deadline)
+
+def unbind_deadline(token) -> None:
+    _current_deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    return _current_deadline.get()
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the deadline (None = unbounded)."""
+    if deadline is None:
+        deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def has_budget(seconds: float, deadline: Optional[float] = None) -> bool:
+    """True if at least `seconds` remain (always True without a deadline)."""
+    left = remaining(deadline)
+    return left is None or left >= seconds
+
+def stage_timeout(reserve: float, deadline: Optional[float] = None) -> Optional[float]:
+    """Time a stage may use while keeping `reserve` seconds (at most half of
+    what is left, so short budgets still get a stage) for what follows it."""
+    left = remaining(deadline)
+    if left is None:
+        return None
+    return max(0.0, left - min(reserve, left / 2))
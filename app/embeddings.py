@@ -11,10 +11,13 @@ class EmbeddingClient:
             self.client = None
         else:
             self.is_mock = False
+            from .llm import shared_http_client
+            # cheap wrapper; connections come from the process-wide pool
             self.client = AzureOpenAI(
                 azure_endpoint=AZURE_OPENAI_ENDPOINT,
                 api_key=AZURE_OPENAI_API_KEY,
                 api_version=AZURE_OPENAI_API_VERSION,
+                http_client=shared_http_client("sync"),
             )
         self.deployment = AZURE_OPENAI_EMBEDDING_DEPLOYMENT
     
@@ -1,3 +1,6 @@
+import inspect
+import threading
+import time
 from langgraph.graph import StateGraph, END
 from .agents.state import AgentState
 from .agents.query_analyzer import analyze
@@ -5,18 +8,66 @@ from .agents.planner import plan
 from .agents.rag_agent import retrieve
 from .agents.tool_agent import exec_tools
 from .agents.report_agent import draft_and_refine
-def build_graph() -> StateGraph:
+from .metrics import metrics, new_trace, bind_trace, unbind_trace
+from .deadline import bind_deadline, unbind_deadline
+
+def _instrumented(name: str, fn):
+    """Time the node into state["metrics"]["timings"] and the process histogram;
+    binds the trace and deadline so LLM/cache calls inside the node are attributed to
+    (and bounded by) this query."""
+    is_async = inspect.iscoroutinefunction(fn)
+    async def node(state: AgentState) -> AgentState:
+        trace = state.get("metrics")
+        if trace is None:
+            trace = state["metrics"] = new_trace()
+        token = bind_trace(trace)
+        deadline_token = bind_deadline(state.get("deadline"))
+        start = time.perf_counter()
+        try:
+            return await fn(state) if is_async else fn(state)
+        finally:
+            elapsed = time.perf_counter() - start
+            trace["timings"][name] = round(elapsed, 6)
+            metrics.observe(f"node.{name}.seconds", elapsed)
+            unbind_deadline(deadline_token)
+            unbind_trace(token)
+    return node
+def _after_plan(state: AgentState) -> str:
+    if state.get("need_rag"):
+        return "rag"
+    return "tools" if state.get("need_tools") else "report"
+
+def _after_rag(state: AgentState) -> str:
+    return "tools" if state.get("need_tools") else "report"
+
+def build_graph(with_report: bool = True) -> StateGraph:
+    """with_report=False stops before the report node (the streaming route drives it itself)."""
     sg = StateGraph(AgentState)
-    sg.add_node("analyze", analyze)
-    sg.add_node("plan", plan)
-    sg.add_node("rag", retrieve)
-    sg.add_node("tools", exec_tools)
-    sg.add_node("report", draft_and_refine)
+    sg.add_node("analyze", _instrumented("analyze", analyze))
+    sg.add_node("plan", _instrumented("plan", plan))
+    sg.add_node("rag", _instrumented("rag", retrieve))
+    sg.add_node("tools", _instrumented("tools", exec_tools))
+    report = "report" if with_report else END
+    if with_report:
+        sg.add_node("report", _instrumented("report", draft_and_refine))
     sg.set_entry_point("analyze")
     sg.add_edge("analyze", "plan")
-    # Conditional branch could be added here; for now always RAG → tools
-    sg.add_edge("plan", "rag")
-    sg.add_edge("rag", "tools")
-    sg.add_edge("tools", "report")
-    sg.add_edge("report", END)
+    # skip stages the question does not need: plan → [rag] → [tools] → report
+    sg.add_conditional_edges("plan", _after_plan, {"rag": "rag", "tools": "tools", "report": report})
+    sg.add_conditional_edges("rag", _after_rag, {"tools": "tools", "report": report})
+    sg.add_edge("tools", report)
+    if with_report:
+        sg.add_edge("report", END)
     return sg
+
+_compiled = {}
+_compile_lock = threading.Lock()
+def get_app(with_report: bool = True):
+    """Process-wide compiled graph (compiled once, shared by API and UI)."""
+    app = _compiled.get(with_report)
+    if app is None:
+        with _compile_lock:
+            app = _compiled.get(with_report)
+            if app is None:
+                app = _compiled[with_report] = build_graph(with_report).compile()
+    return app
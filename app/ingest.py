@@ -1,4 +1,28 @@
+import itertools
+from .config import DATA_DIR, INDEX_DIR
 from .vectorstore.faiss_store import FaissStore
+
+_generation = itertools.count(1)
+_current_generation = 0
+
+def bump_index_version() -> None:
+    """Mark the index as changed in this process (rebuild, upload, delete)."""
+    global _current_generation
+    _current_generation = next(_generation)
+
+def index_version() -> str:
+    # cheap (a few stat calls): index files + docs dir mtime + in-process generation
+    parts = [str(_current_generation)]
+    for p in (INDEX_DIR / "faiss.index", INDEX_DIR / "meta.json", DATA_DIR):
+        try:
+            parts.append(str(p.stat().st_mtime_ns))
+        except OSError:
+            parts.append("0")
+    return "-".join(parts)
+
 def rebuild_index():
     fs = FaissStore()
-    return fs.build()
+    try:
+        return fs.build()
+    finally:
+        bump_index_version()
@@ -1,38 +1,301 @@
 import os
-from typing import List, Dict
+import asyncio
+import contextvars
+import hashlib
+import importlib.util
+import json
+import threading
+import time
+import types
+from contextlib import aclosing
+from typing import Any, AsyncIterator, List, Dict
+from .metrics import metrics, record_llm_usage, record_cache
+from .deadline import bind_deadline, current_deadline, remaining
+from .ratelimit import get_limiter
+from .llm_cache import llm_response_cache
+from .resilience import call_with_retries, call_with_retries_sync, hedged, hedge_delay
+from .tokens import count_tokens
 from .config import (
-    LLM_PROVIDER, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION, AZURE_OPENAI_DEPLOYMENT
+    LLM_PROVIDER, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION, AZURE_OPENAI_DEPLOYMENT,
+    LLM_POOL_MAX_CONNECTIONS, LLM_POOL_MAX_KEEPALIVE, LLM_POOL_KEEPALIVE_EXPIRY, LLM_HTTP2,
+    LLM_COMPLETION_TOKENS_ESTIMATE,
 )
-class LLMClient:
+
+_http_pool: Dict[str, Any] = {}
+_http_lock = threading.Lock()
+def _http2_enabled() -> bool:
+    return LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+def shared_http_client(kind: str = "sync"):
+    """Process-wide keep-alive connection pool ("sync" or "async") shared by every
+    OpenAI client, so TLS setup is paid once per connection instead of per client."""
+    client = _http_pool.get(kind)
+    if client is None:
+        with _http_lock:
+            client = _http_pool.get(kind)
+            if client is None:
+                import httpx
+                from openai import DefaultHttpxClient, DefaultAsyncHttpxClient  # type: ignore
+                cls = DefaultAsyncHttpxClient if kind == "async" else DefaultHttpxClient
+                client = _http_pool[kind] = cls(
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+                    ),
+                    http2=_http2_enabled(),
+                )
+    return client
+
+TEMPERATURE = 0.2
+UNLABELED = "unlabeled"
+
+class _Flight:
+    """One upstream request shared by concurrent identical callers (single-flight).
+    It runs on the latest deadline among the callers still waiting, not on the first
+    caller's, and is cancelled once the last of them has left."""
     def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.deadlines: List[float | None] = []
+        self.recorded = False
+
+    def deadline(self) -> float | None:
+        if not self.deadlines or None in self.deadlines:
+            return None
+        return max(self.deadlines)
+
+    def join(self, deadline: float | None) -> None:
+        self.deadlines.append(deadline)
+
+    def leave(self, deadline: float | None, key: str) -> None:
+        self.deadlines.remove(deadline)
+        if not self.deadlines and not self.task.done():
+            # nobody is waiting: stop spending retries and limiter quota on it
+            if _inflight.get(key) is self:
+                del _inflight[key]
+            self.task.cancel()
+
+def _flight_done(key: str, flight: _Flight) -> None:
+    if _inflight.get(key) is flight:
+        del _inflight[key]
+    if not flight.task.cancelled():
+        flight.task.exception()  # retrieved even when every caller has already given up
+
+# single-flight: key -> upstream request shared by concurrent identical requests
+_inflight: Dict[str, _Flight] = {}
+
+class LLMClient:
+    def __init__(self, deployment: str | None = None):
         self.provider = LLM_PROVIDER
+        self.deployment = deployment or AZURE_OPENAI_DEPLOYMENT
+        self.limiter = get_limiter(self.deployment)
         self.is_mock = False
         if self.provider == "azure":
             try:
-                from openai import AzureOpenAI  # type: ignore
+                from openai import AzureOpenAI, AsyncAzureOpenAI  # type: ignore
                 if not (AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY):
                     self.is_mock = True
                     self.client = None
+                    self.aclient = None
                 else:
-                    self.client = AzureOpenAI(
+                    kwargs = dict(
                         azure_endpoint=AZURE_OPENAI_ENDPOINT,
                         api_key=AZURE_OPENAI_API_KEY,
                         api_version=AZURE_OPENAI_API_VERSION,
+                        max_retries=0,  # retries/backoff are handled by app.resilience
                     )
+                    self.client = AzureOpenAI(http_client=shared_http_client("sync"), **kwargs)
+                    self.aclient = AsyncAzureOpenAI(http_client=shared_http_client("async"), **kwargs)
             except Exception:
                 self.is_mock = True
                 self.client = None
+                self.aclient = None
         else:
             self.is_mock = True
             self.client = None
-    def chat(self, messages: List[Dict[str, str]], system: str | None = None) -> str:
+            self.aclient = None
+    @staticmethod
+    def _mock_answer(messages: List[Dict[str, str]], system: str | None) -> str:
+        last_user = next((m["content"] for m in reversed(messages) if m["role"]=="user"), "")
+        plan = next((m["content"] for m in reversed(messages) if m["role"]=="assistant" and m["content"].startswith("Plan:")), "")
+        return f"(MOCK) System: {system or 'N/A'}\nPlan/Notes: {plan}\n\nAnswer:\n- {last_user}\n\n(Set up Azure OpenAI env in .env to enable real answers.)"
+    @staticmethod
+    def _deadline_kwargs() -> Dict[str, float]:
+        # per-call timeout = time left on the current query's deadline (client default otherwise)
+        left = remaining()
+        if left is None:
+            return {}
+        if left <= 0:
+            raise asyncio.TimeoutError("query deadline exceeded")
+        return {"timeout": left}
+    @staticmethod
+    def _messages(messages: List[Dict[str, str]], system: str | None) -> List[Dict[str, str]]:
+        return ([{"role":"system","content":system}] if system else []) + messages
+    def _estimate_tokens(self, messages: List[Dict[str, str]]) -> int:
+        # TPM reservation: prompt tokens plus an assumed completion, settled from usage afterwards
+        prompt = sum(count_tokens(m["content"], self.deployment) + 4 for m in messages)
+        return prompt + LLM_COMPLETION_TOKENS_ESTIMATE
+    def chat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> str:
+        """`site` labels the call site for per-site token / latency stats."""
+        self._deadline_kwargs()  # fail fast once the query deadline has passed
+        site = site or UNLABELED
         if self.is_mock or self.client is None:
-            last_user = next((m["content"] for m in reversed(messages) if m["role"]=="user"), "")
-            plan = next((m["content"] for m in reversed(messages) if m["role"]=="assistant" and m["content"].startswith("Plan:")), "")
-            return f"(MOCK) System: {system or 'N/A'}\nPlan/Notes: {plan}\n\nAnswer:\n- {last_user}\n\n(Set up Azure OpenAI env in .env to enable real answers.)"
-        resp = self.client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT,
-            messages=([{"role":"system","content":system}] if system else []) + messages,
-            temperature=0.2,
-        )
+            record_llm_usage(site=site)
+            return self._mock_answer(messages, system)
+        started = time.perf_counter()
+        resp = call_with_retries_sync(lambda: self.client.chat.completions.create(
+            model=self.deployment,
+            messages=self._messages(messages, system),
+            temperature=TEMPERATURE,
+            **self._deadline_kwargs(),
+        ), self.deployment)
+        metrics.observe(f"llm.site.{site}.seconds", time.perf_counter() - started)
+        record_llm_usage(resp.usage, site)
         return resp.choices[0].message.content
+    async def achat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> str:
+        """Non-blocking chat on the async client, behind the deployment's RPM/TPM/concurrency limiter.
+        `site` labels the call site for per-site token / latency stats; sites with a
+        configured TTL are served from the disk cache."""
+        deadline = self._deadline_kwargs()
+        site = site or UNLABELED
+        if self.is_mock or self.aclient is None:
+            record_llm_usage(site=site)
+            return self._mock_answer(messages, system)
+        msgs = self._messages(messages, system)
+        key = self._flight_key(msgs)
+        cacheable = llm_response_cache.enabled_for(site)
+        if cacheable:
+            text = await asyncio.to_thread(llm_response_cache.get, key, site)
+            record_cache("llm_response", "hit" if text is not None else "miss")
+            if text is not None:
+                metrics.incr(f"llm.site.{site}.cache_hits")
+                return text
+        started = time.perf_counter()
+        flight = _inflight.get(key)
+        if flight is None:
+            flight = _inflight[key] = _Flight()
+            # created in an empty context so the shared request does not inherit this caller's deadline
+            flight.task = contextvars.Context().run(asyncio.ensure_future, self._acreate(msgs, flight))
+            flight.task.add_done_callback(lambda _, f=flight: _flight_done(key, f))
+        else:
+            # identical request already upstream (double click, same file in a shared room): reuse it
+            metrics.incr("llm.singleflight.coalesced")
+            record_cache("llm_singleflight", "hit")
+        waiter_deadline = current_deadline()
+        flight.join(waiter_deadline)
+        try:
+            # the HTTP timeout is per attempt; wait_for also bounds limiter waits and retries.
+            # shield: one caller timing out or disconnecting must not cancel the shared request
+            resp = await asyncio.wait_for(asyncio.shield(flight.task), deadline.get("timeout"))
+        finally:
+            flight.leave(waiter_deadline, key)
+        text = resp.choices[0].message.content
+        metrics.observe(f"llm.site.{site}.seconds", time.perf_counter() - started)
+        if not flight.recorded:
+            # usage and cache write once per upstream call, by the first caller to get it
+            flight.recorded = True
+            record_llm_usage(resp.usage, site)
+            if cacheable and text:
+                await asyncio.to_thread(llm_response_cache.set, key, site, text)
+        return text
+    def _flight_key(self, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps([self.deployment, messages, TEMPERATURE], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    async def _acreate(self, messages: List[Dict[str, str]], flight: _Flight | None = None):
+        async def attempt():
+            if flight is not None:
+                # waiters join and leave while the request is in flight: each attempt uses
+                # the latest deadline still waited on
+                bind_deadline(flight.deadline())
+            return await hedged(lambda: self._attempt(messages), hedge_delay(self.deployment))
+        # retries wrap the (optionally hedged) attempt; each attempt takes its own limiter slot
+        return await call_with_retries(attempt, self.deployment)
+    async def _attempt(self, messages: List[Dict[str, str]]):
+        async with self.limiter.reserve(self._estimate_tokens(messages)) as permit:
+            started = time.perf_counter()
+            resp = await self.aclient.chat.completions.create(
+                model=self.deployment,
+                messages=messages,
+                temperature=TEMPERATURE,
+                **self._deadline_kwargs(),
+            )
+            metrics.observe(f"llm.upstream.{self.deployment}.seconds", time.perf_counter() - started)
+            permit.settle(resp.usage)
+            return resp
+    async def astream_chat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> AsyncIterator[str]:
+        """Yield completion text deltas as they arrive. Closing the generator closes the upstream stream."""
+        self._deadline_kwargs()
+        site = site or UNLABELED
+        if self.is_mock or self.aclient is None:
+            record_llm_usage(site=site)
+            for word in self._mock_answer(messages, system).split(" "):
+                yield word + " "
+            return
+        msgs = self._messages(messages, system)
+        started = time.perf_counter()
+        parts: List[str] = []
+        try:
+            async with aclosing(self._astream(msgs)) as stream:
+                async for delta in stream:
+                    if not parts:
+                        metrics.observe(f"llm.site.{site}.ttft_seconds", time.perf_counter() - started)
+                    parts.append(delta)
+                    yield delta
+        finally:
+            metrics.observe(f"llm.site.{site}.seconds", time.perf_counter() - started)
+            # streamed responses carry no usage: count tokens locally
+            record_llm_usage(types.SimpleNamespace(
+                prompt_tokens=self._estimate_tokens(msgs) - LLM_COMPLETION_TOKENS_ESTIMATE,
+                completion_tokens=count_tokens("".join(parts), self.deployment),
+            ), site)
+    async def _astream(self, msgs: List[Dict[str, str]]) -> AsyncIterator[str]:
+        # the concurrency slot is held until the stream is drained or closed
+        async with self.limiter.reserve(self._estimate_tokens(msgs)):
+            # only opening the stream is retried; a stream that fails mid-answer is not replayed
+            stream = await call_with_retries(lambda: self.aclient.chat.completions.create(
+                model=self.deployment,
+                messages=msgs,
+                temperature=TEMPERATURE,
+                stream=True,
+                **self._deadline_kwargs(),
+            ), self.deployment)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+def get_llm_client(deployment: str | None = None) -> LLMClient:
+    """Process-wide client per deployment; all of them share one connection pool."""
+    key = deployment or AZURE_OPENAI_DEPLOYMENT
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = LLMClient(key)
+    return client
+
+def llm_pool_stats() -> Dict[str, Any]:
+    return {
+        "clients": sorted(_clients),
+        "http2": _http2_enabled(),
+        "max_connections": LLM_POOL_MAX_CONNECTIONS,
+        "max_keepalive": LLM_POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": LLM_POOL_KEEPALIVE_EXPIRY,
+        "pools": sorted(_http_pool),
+    }
+
+async def aclose_llm_clients() -> None:
+    """Close the shared connection pools (application shutdown)."""
+    with _http_lock:
+        pools = dict(_http_pool)
+        _http_pool.clear()
+    _clients.clear()
+    if "async" in pools:
+        await pools["async"].aclose()
+    if "sync" in pools:
+        pools["sync"].close()
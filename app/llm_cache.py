@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from .metrics import metrics
+from .config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTLS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed);
+"""
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """"code_analysis=86400,suggestions=3600" -> {site: ttl seconds}"""
+    ttls = {}
+    for part in spec.split(","):
+        site, _, ttl = part.partition("=")
+        if site.strip() and ttl.strip():
+            ttls[site.strip()] = float(ttl)
+    return ttls
+
+class DiskResponseCache:
+    """SQLite-backed LLM response cache: prompt-hash keys, per-call-site TTLs, LRU eviction by last access.
+    Only call sites listed in `ttls` are cached, so non-deterministic prompts stay opt-out."""
+    def __init__(self, path: str, max_entries: int = 10000, ttls: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def enabled_for(self, site: Optional[str]) -> bool:
+        return site is not None and site in self.ttls
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, site: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT response, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                db.commit()
+                self.hits += 1
+                metrics.incr(f"llm_cache.{site}.hit")
+                return row[0]
+            if row is not None:
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                db.commit()
+            self.misses += 1
+        metrics.incr(f"llm_cache.{site}.miss")
+        return None
+
+    def set(self, key: str, site: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, site, response, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, site, response, now + self.ttls[site], now),
+            )
+            # evict expired rows first, then least recently used beyond the bound
+            db.execute("DELETE FROM llm_cache WHERE expires <= ?", (now,))
+            db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        size = None
+        if self._conn is not None:
+            with self._lock:
+                size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "path": self.path,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttls": self.ttls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+# opt-in: LLM_CACHE_TTLS is empty unless configured
+llm_response_cache = DiskResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, parse_ttls(LLM_CACHE_TTLS))
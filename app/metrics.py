@@ -0,0 +1,175 @@
+"""
+프로세스 메트릭 (히스토그램 / 카운터) 및 쿼리별 트레이스
+"""
+
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    """누적 버킷 히스토그램 + 최근 관측값 기반 분위수"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS, window: int = 1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{b}": c for b, c in zip(self.buckets, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """이름별 히스토그램 / 카운터 저장소"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        h = self._histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(name, Histogram(buckets))
+        return h
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.histogram(name, buckets).observe(value)
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        return {
+            "histograms": {k: h.snapshot() for k, h in sorted(self._histograms.items()) if k.startswith(prefix)},
+            "counters": {k: v for k, v in sorted(self._counters.items()) if k.startswith(prefix)},
+        }
+
+
+metrics = MetricsRegistry()
+
+# 현재 쿼리의 트레이스 (AgentState["metrics"]와 같은 dict)
+_current_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar("query_trace", default=None)
+
+
+def new_trace() -> Dict[str, Any]:
+    return {
+        "timings": {},
+        "llm": {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0},
+        "cache": {},
+        "candidates": {},
+        "degraded": [],
+    }
+
+
+def current_trace() -> Optional[Dict[str, Any]]:
+    return _current_trace.get()
+
+
+def bind_trace(trace: Optional[Dict[str, Any]]):
+    """트레이스를 현재 컨텍스트에 연결 (반환된 토큰으로 unbind_trace)"""
+    return _current_trace.set(trace)
+
+
+def unbind_trace(token) -> None:
+    _current_trace.reset(token)
+
+
+def record_llm_usage(usage: Any = None, site: Optional[str] = None) -> None:
+    """LLM 호출 1회와 응답 usage(prompt/completion 토큰)를 전체 및 호출 위치(site)별로 기록
+    
+    cached: prompt 중 공급자 프롬프트 캐시(동일 접두사 재사용)로 처리된 토큰 (prompt_tokens_details.cached_tokens)
+    """
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    metrics.incr("llm.calls")
+    if site is not None:
+        metrics.incr(f"llm.site.{site}.calls")
+    if usage is not None:
+        metrics.observe("llm.prompt_tokens", prompt, TOKEN_BUCKETS)
+        metrics.observe("llm.completion_tokens", completion, TOKEN_BUCKETS)
+        metrics.observe("llm.cached_tokens", cached, TOKEN_BUCKETS)
+        if site is not None:
+            metrics.observe(f"llm.site.{site}.prompt_tokens", prompt, TOKEN_BUCKETS)
+            metrics.observe(f"llm.site.{site}.completion_tokens", completion, TOKEN_BUCKETS)
+            metrics.observe(f"llm.site.{site}.cached_tokens", cached, TOKEN_BUCKETS)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["llm"]["calls"] += 1
+        trace["llm"]["prompt_tokens"] += prompt
+        trace["llm"]["completion_tokens"] += completion
+        trace["llm"]["cached_tokens"] += cached
+
+
+def llm_site_stats() -> Dict[str, Any]:
+    """호출 위치별 호출 수 / 토큰 / 지연 요약 (총 토큰 내림차순)"""
+    snap = metrics.snapshot("llm.site.")
+    sites: Dict[str, Dict[str, Any]] = {}
+    for name, value in snap["counters"].items():
+        site, field = name[len("llm.site."):].rsplit(".", 1)
+        sites.setdefault(site, {})[field] = value
+    for name, h in snap["histograms"].items():
+        site, field = name[len("llm.site."):].rsplit(".", 1)
+        sites.setdefault(site, {})[field] = {k: h[k] for k in ("count", "sum", "mean", "p50", "p95", "p99")}
+    for stats in sites.values():
+        stats["total_tokens"] = sum(stats.get(f, {}).get("sum", 0) for f in ("prompt_tokens", "completion_tokens"))
+        prompt = stats.get("prompt_tokens", {}).get("sum", 0)
+        stats["prompt_cache_ratio"] = round(stats.get("cached_tokens", {}).get("sum", 0) / prompt, 4) if prompt else 0.0
+    return dict(sorted(sites.items(), key=lambda kv: kv[1]["total_tokens"], reverse=True))
+
+
+def record_cache(name: str, outcome: str) -> None:
+    """캐시 결과 기록 (outcome: hit | miss | skip)"""
+    metrics.incr(f"cache.{name}.{outcome}")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["cache"][name] = outcome
+
+
+def record_candidates(name: str, count: int) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["candidates"][name] = count
+
+
+def record_degraded(stage: str) -> None:
+    """데드라인 부족으로 생략/축소된 단계 기록 (rewrite, retrieval, tools, critic, draft)"""
+    metrics.incr(f"degraded.{stage}")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.setdefault("degraded", []).append(stage)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from .metrics import metrics
+from .config import LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY, LLM_DEPLOYMENT_LIMITS
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `capacity`; acquire waits (FIFO) until enough are available."""
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Take `amount` units, sleeping until they have refilled; returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= amount
+        return waited
+
+    def adjust(self, amount: float) -> None:
+        # correct an estimate after the fact; going negative makes later callers wait off the debt
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class _Permit:
+    def __init__(self, limiter: "LLMLimiter", estimated: int):
+        self.limiter = limiter
+        self.estimated = estimated
+
+    def settle(self, usage: Any = None) -> None:
+        """Replace the token estimate with the response's actual usage."""
+        actual = getattr(usage, "total_tokens", None)
+        if actual is not None and self.limiter.tokens is not None:
+            self.limiter.tokens.adjust(actual - self.estimated)
+
+class LLMLimiter:
+    """Requests/min and tokens/min buckets plus a concurrency cap in front of every upstream LLM call."""
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_concurrency: int = 16, name: str = "default"):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled_seconds = 0.0
+
+    @asynccontextmanager
+    async def reserve(self, estimated_tokens: int) -> AsyncIterator[_Permit]:
+        started = time.perf_counter()
+        async with self._semaphore:
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None:
+                await self.tokens.acquire(estimated_tokens)
+            waited = time.perf_counter() - started
+            self.throttled_seconds += waited
+            metrics.observe(f"llm.limiter.{self.name}.wait_seconds", waited)
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                yield _Permit(self, estimated_tokens)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": round(self.requests.rate * 60) if self.requests else None,
+            "tpm": round(self.tokens.rate * 60) if self.tokens else None,
+            "requests_available": round(self.requests.tokens, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.tokens) if self.tokens else None,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+        }
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int, int]]:
+    """"gpt-4o=120:40000:8,gpt-4o-mini=600:200000:32" -> {deployment: (rpm, tpm, max_concurrency)}"""
+    limits = {}
+    for part in spec.split(","):
+        deployment, _, values = part.partition("=")
+        if deployment.strip() and values.strip():
+            rpm, tpm, concurrency = (int(v) for v in values.split(":"))
+            limits[deployment.strip()] = (rpm, tpm, concurrency)
+    return limits
+
+_overrides = parse_limits(LLM_DEPLOYMENT_LIMITS)
+_limiters: Dict[str, LLMLimiter] = {}
+_limiters_lock = threading.Lock()
+def get_limiter(deployment: str) -> LLMLimiter:
+    """One limiter per deployment (Azure quotas are per deployment), shared by every client using it."""
+    limiter = _limiters.get(deployment)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(deployment)
+            if limiter is None:
+                rpm, tpm, concurrency = _overrides.get(deployment, (LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY))
+                limiter = _limiters[deployment] = LLMLimiter(rpm, tpm, concurrency, deployment)
+    return limiter
+
+def limiter_stats() -> Dict[str, Any]:
+    return {name: limiter.stats() for name, limiter in sorted(_limiters.items())}
@@ -0,0 +1,196 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from .metrics import metrics
+from .deadline import remaining
+from .config import (
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET, LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_SAMPLES,
+)
+
+T = TypeVar("T")
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream while a deployment's breaker is open."""
+
+class CircuitBreaker:
+    """closed -> open after `failures` consecutive upstream faults; after `reset` seconds
+    one probe call is let through (half-open) and its outcome closes or re-opens it."""
+    def __init__(self, name: str, failures: int = 5, reset: float = 30.0):
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+        metrics.incr(f"llm.breaker.{self.name}.rejected")
+        raise CircuitOpenError(f"LLM deployment {self.name!r} is unavailable (circuit open)")
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state, self.consecutive = "closed", 0
+                return
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    metrics.incr(f"llm.breaker.{self.name}.opened")
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def release(self) -> None:
+        # no verdict on upstream (cancelled, throttled, rejected, out of time): just free the half-open probe
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+def get_breaker(deployment: str) -> CircuitBreaker:
+    breaker = _breakers.get(deployment)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(deployment, CircuitBreaker(deployment, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET))
+    return breaker
+
+def breaker_stats() -> Dict[str, Any]:
+    return {name: b.stats() for name, b in sorted(_breakers.items())}
+
+def _status(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+def is_retryable(exc: BaseException) -> bool:
+    """429, 408/409 and 5xx responses, timeouts and connection errors."""
+    status = _status(exc)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    name = type(exc).__name__
+    # our own deadline's TimeoutError is not retryable: there is no time left to retry in
+    return name in ("APITimeoutError", "APIConnectionError") or isinstance(exc, ConnectionError)
+
+def is_upstream_fault(exc: BaseException) -> bool:
+    # what the breaker counts: throttling (429) and bad requests (4xx) say nothing about health
+    return is_retryable(exc) and _status(exc) != 429
+
+def _record_failure(breaker: CircuitBreaker, exc: BaseException) -> None:
+    # only upstream faults are a verdict; 429 / 4xx / our own deadline neither reset the
+    # failure streak nor close a half-open breaker, they just free the probe
+    if is_upstream_fault(exc):
+        breaker.record(False)
+    else:
+        breaker.release()
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+def _backoff(attempt: int, exc: BaseException) -> float:
+    hinted = retry_after(exc)
+    if hinted is not None:
+        return min(hinted, LLM_RETRY_MAX_DELAY)
+    # full jitter keeps a burst of failed callers from retrying in lockstep
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+def _give_up(attempt: int, exc: BaseException, delay: float) -> bool:
+    if attempt >= LLM_MAX_RETRIES or not is_retryable(exc):
+        return True
+    left = remaining()
+    return left is not None and delay >= left
+
+async def call_with_retries(fn: Callable[[], Awaitable[T]], deployment: str) -> T:
+    """Run `fn` behind the deployment's breaker, retrying transient failures with backoff (honoring Retry-After)."""
+    breaker = get_breaker(deployment)
+    attempt = 0
+    while True:
+        breaker.allow()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as exc:
+            _record_failure(breaker, exc)
+            delay = _backoff(attempt, exc)
+            if _give_up(attempt, exc, delay):
+                raise
+            metrics.incr(f"llm.retries.{deployment}")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record(True)
+        return result
+
+def call_with_retries_sync(fn: Callable[[], T], deployment: str) -> T:
+    breaker = get_breaker(deployment)
+    attempt = 0
+    while True:
+        breaker.allow()
+        try:
+            result = fn()
+        except Exception as exc:
+            _record_failure(breaker, exc)
+            delay = _backoff(attempt, exc)
+            if _give_up(attempt, exc, delay):
+                raise
+            metrics.incr(f"llm.retries.{deployment}")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record(True)
+        return result
+
+def hedge_delay(deployment: str) -> Optional[float]:
+    """p95 of recent upstream latency, once there are enough samples to trust it."""
+    if not LLM_HEDGE_ENABLED:
+        return None
+    hist = metrics.histogram(f"llm.upstream.{deployment}.seconds")
+    if hist.count < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return hist.quantile(0.95)
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """Start `fn`; if it has not finished after `delay`, start a duplicate and take whichever succeeds first."""
+    first = asyncio.ensure_future(fn())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.incr("llm.hedge.sent")
+            tasks.append(asyncio.ensure_future(fn()))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if t.exception() is None), None)
+            if winner is not None:
+                if winner is not first:
+                    metrics.incr("llm.hedge.won")
+                return winner.result()
+            if not pending:
+                return first.result()  # all failed: raise the original request's error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
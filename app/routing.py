@@ -0,0 +1,109 @@
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List
+from .llm import LLMClient, UNLABELED, get_llm_client
+from .metrics import metrics
+from .resilience import CircuitOpenError, is_retryable
+from .config import AZURE_OPENAI_DEPLOYMENT, AZURE_OPENAI_FAST_DEPLOYMENT, LLM_ROUTES
+
+_ALIASES = {"main": AZURE_OPENAI_DEPLOYMENT, "fast": AZURE_OPENAI_FAST_DEPLOYMENT or AZURE_OPENAI_DEPLOYMENT}
+
+def parse_routes(spec: str) -> Dict[str, List[str]]:
+    """"*=main,classification=fast|main" -> {site: [deployment, fallback, ...]} with aliases resolved"""
+    routes: Dict[str, List[str]] = {}
+    for part in spec.split(","):
+        site, _, chain = part.partition("=")
+        if not (site.strip() and chain.strip()):
+            continue
+        resolved: List[str] = []
+        for name in chain.split("|"):
+            deployment = _ALIASES.get(name.strip(), name.strip())
+            if deployment and deployment not in resolved:
+                resolved.append(deployment)
+        routes[site.strip()] = resolved
+    routes.setdefault("*", [AZURE_OPENAI_DEPLOYMENT])
+    return routes
+
+def _should_fall_back(exc: BaseException) -> bool:
+    # breaker open or retries exhausted on a transient error; our own deadline and bad requests are final
+    return isinstance(exc, CircuitOpenError) or is_retryable(exc)
+
+class LLMRouter:
+    """Same chat interface as LLMClient, but each call site goes to its routed deployment,
+    moving down the site's fallback chain when a deployment is unavailable."""
+    def __init__(self, routes: Dict[str, List[str]]):
+        self.routes = routes
+
+    def chain(self, site: str | None) -> List[str]:
+        return self.routes.get(site or UNLABELED) or self.routes["*"]
+
+    @property
+    def is_mock(self) -> bool:
+        return get_llm_client().is_mock
+
+    def _clients(self, site: str) -> List[LLMClient]:
+        return [get_llm_client(deployment) for deployment in self.chain(site)]
+
+    def _served(self, site: str, client: LLMClient, attempt: int) -> None:
+        metrics.incr(f"llm.route.{site}.{client.deployment}")
+        if attempt:
+            metrics.incr(f"llm.route.{site}.fallbacks")
+
+    def _failed(self, client: LLMClient, exc: BaseException, last: bool) -> None:
+        if last or not _should_fall_back(exc):
+            raise exc
+        metrics.incr(f"llm.route.fallback_from.{client.deployment}")
+
+    def chat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> str:
+        site = site or UNLABELED
+        clients = self._clients(site)
+        for attempt, client in enumerate(clients):
+            try:
+                text = client.chat(messages, system, site)
+            except Exception as exc:
+                self._failed(client, exc, attempt == len(clients) - 1)
+                continue
+            self._served(site, client, attempt)
+            return text
+
+    async def achat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> str:
+        site = site or UNLABELED
+        clients = self._clients(site)
+        for attempt, client in enumerate(clients):
+            try:
+                text = await client.achat(messages, system, site)
+            except Exception as exc:
+                self._failed(client, exc, attempt == len(clients) - 1)
+                continue
+            self._served(site, client, attempt)
+            return text
+
+    async def astream_chat(self, messages: List[Dict[str, str]], system: str | None = None, site: str | None = None) -> AsyncIterator[str]:
+        """Falls back only while nothing has been yielded; a stream that fails mid-answer is not replayed."""
+        site = site or UNLABELED
+        clients = self._clients(site)
+        for attempt, client in enumerate(clients):
+            started = False
+            try:
+                async with aclosing(client.astream_chat(messages, system, site)) as stream:
+                    async for delta in stream:
+                        if not started:
+                            started = True
+                            self._served(site, client, attempt)
+                        yield delta
+            except Exception as exc:
+                if started:
+                    raise
+                self._failed(client, exc, attempt == len(clients) - 1)
+                continue
+            if not started:
+                self._served(site, client, attempt)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        counters = metrics.snapshot("llm.route.")["counters"]
+        return {
+            "routes": self.routes,
+            "served": {k[len("llm.route."):]: v for k, v in counters.items()},
+        }
+
+llm_router = LLMRouter(parse_routes(LLM_ROUTES))
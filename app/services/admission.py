@@ -0,0 +1,148 @@
+"""
+쿼리 어드미션 컨트롤 (부하 차단 / 단계적 품질 저하)
+
+동시 실행 수를 제한하고 초과 요청은 타임아웃이 있는 대기열에서 기다리게 한다.
+처리 시간 EWMA와 대기열 깊이에 따라 모드를 자동으로 낮춘다:
+normal → no_rewrite → no_critic → cached_only (답변 캐시 적중만 응답)
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedError
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODES = ("normal", "no_rewrite", "no_critic", "cached_only")
+
+# 대기열 점유율 기준 (max_queue 대비) - 각각 no_rewrite / no_critic / cached_only
+_QUEUE_LEVELS = (0.25, 0.5, 0.9)
+
+
+def at_least(mode: str, level: str) -> bool:
+    """mode가 level 이상으로 저하된 상태인지 (예: cached_only는 no_critic의 생략도 포함)"""
+    return MODES.index(mode) >= MODES.index(level)
+
+
+class AdmissionController:
+    """동시 실행 제한 + 대기열 + 지연 EWMA 기반 모드 전환"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 128,
+        queue_timeout: float = 10.0,
+        ewma_alpha: float = 0.2,
+        ewma_half_life: float = 30.0,
+        latency_levels: tuple = (8.0, 15.0, 25.0),
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.ewma_alpha = ewma_alpha
+        self.ewma_half_life = ewma_half_life
+        self.latency_levels = latency_levels
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self._ewma = 0.0
+        self._ewma_at = time.monotonic()
+        self._mode = "normal"
+        self.admitted = 0
+        self.rejected = 0
+
+    def latency(self) -> float:
+        """처리 시간 EWMA - 관측이 없으면 반감기로 감쇠 (cached_only에서 회복할 수 있도록)"""
+        idle = time.monotonic() - self._ewma_at
+        return self._ewma * 0.5 ** (idle / self.ewma_half_life)
+
+    def _observe(self, seconds: float) -> None:
+        self._ewma = self.ewma_alpha * seconds + (1 - self.ewma_alpha) * self.latency()
+        self._ewma_at = time.monotonic()
+
+    @property
+    def mode(self) -> str:
+        latency, pressure = self.latency(), self.waiting / max(self.max_queue, 1)
+        level = sum(latency >= t for t in self.latency_levels)
+        level = max(level, sum(pressure >= t for t in _QUEUE_LEVELS))
+        mode = MODES[level]
+        if mode != self._mode:
+            logger.warning(f"어드미션 모드 변경: {self._mode} → {mode} (지연 EWMA {latency:.2f}초, 대기 {self.waiting})")
+            metrics.incr(f"admission.mode_changes.{mode}")
+            self._mode = mode
+        return mode
+
+    def _reject(self, reason: str) -> ServiceOverloadedError:
+        self.rejected += 1
+        metrics.incr(f"admission.rejected.{reason}")
+        return ServiceOverloadedError(
+            message="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도하세요.",
+            details={"reason": reason, "mode": self._mode, "retry_after": max(1, round(self.latency()))}
+        )
+
+    @asynccontextmanager
+    async def admit(self, max_wait: Optional[float] = None) -> AsyncIterator[str]:
+        """실행 슬롯 획득 후 현재 모드를 반환. cached_only이거나 대기열이 가득/시간 초과면 거절
+        
+        max_wait: 요청 데드라인까지 남은 시간 (queue_timeout보다 짧으면 이 값까지만 대기)
+        """
+        # 가득 찬 대기열은 항상 cached_only 점유율이기도 하므로 먼저 확인 (더 구체적인 사유)
+        if self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        if self.mode == "cached_only":
+            raise self._reject("cached_only")
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            wait = self.queue_timeout if max_wait is None else max(0.0, min(self.queue_timeout, max_wait))
+            await asyncio.wait_for(self._semaphore.acquire(), wait)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout")
+        finally:
+            self.waiting -= 1
+        metrics.observe("admission.queue_seconds", time.perf_counter() - queued)
+        if self.mode == "cached_only":
+            # 대기하는 동안 cached_only로 내려갔으면 그래프를 실행하지 않음
+            self._semaphore.release()
+            raise self._reject("cached_only")
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield self.mode
+        finally:
+            self._observe(time.perf_counter() - started)
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "latency_ewma": round(self.latency(), 4),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+# 전역 어드미션 컨트롤러
+admission = AdmissionController(
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    ewma_alpha=settings.ADMISSION_EWMA_ALPHA,
+    ewma_half_life=settings.ADMISSION_EWMA_HALF_LIFE,
+    latency_levels=(
+        settings.ADMISSION_NO_REWRITE_LATENCY,
+        settings.ADMISSION_NO_CRITIC_LATENCY,
+        settings.ADMISSION_CACHED_ONLY_LATENCY,
+    ),
+)
@@ -10,8 +10,9 @@ from datetime import datetime
 import ast
 import re
 
-from ..llm import LLMClient
+from ..routing import llm_router
 from .code_analysis_service import CodeAnalysisService
+from .code_context import cursor_lines, fit_code
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ class AICodingAssistant:
     """AI 코딩 어시스턴트"""
     
     def __init__(self):
-        self.llm_client = LLMClient()
+        self.llm_client = llm_router  # 호출 위치(site)별 배포로 라우팅
         self.code_analyzer = CodeAnalysisService()
         self.conversation_history = {}  # 사용자별 대화 히스토리
         self.code_context = {}  # 코드 컨텍스트 저장
@@ -65,8 +66,8 @@ class AICodingAssistant:
             # AI 분석 프롬프트 생성
             prompt = self._create_analysis_prompt(code, file_path, language, basic_analysis)
             
-            # LLM을 통한 분석
-            ai_response = await self._call_llm(prompt, system_prompt=self._get_analysis_system_prompt())
+            # LLM을 통한 분석 (코드가 같으면 프롬프트가 같으므로 응답 캐시 대상)
+            ai_response = await self._call_llm(prompt, system_prompt=self._get_analysis_system_prompt(), site="code_analysis")
             
             # 응답 파싱
             ai_analysis = self._parse_ai_response(ai_response)
@@ -82,24 +83,9 @@ class AICodingAssistant:
         metrics = basic_analysis.get("metrics", {})
         issues = basic_analysis.get("issues", [])
         
+        # 고정 지시와 응답 형식을 앞에, 파일별 내용을 뒤에 (공급자 프롬프트 캐시는 동일한 앞부분만 재사용)
         prompt = f"""
-다음 {language} 코드를 분석하고 개선 제안을 해주세요:
-
-파일: {file_path}
-코드:
-```{language}
-{code}
-```
-
-기본 분석 결과:
-- 라인 수: {metrics.get('lines_of_code', 0)}
-- 함수 수: {metrics.get('functions', 0)}
-- 클래스 수: {metrics.get('classes', 0)}
-- 복잡도: {metrics.get('complexity', 0)}
-- 품질 점수: {basic_analysis.get('quality_score', 0)}
-
-발견된 이슈:
-{chr(10).join([f"- {issue.get('type', 'unknown')}: {issue.get('message', '')}" for issue in issues[:5]])}
+아래 코드를 분석하고 개선 제안을 해주세요.
 
 다음 항목들을 분석해주세요:
 1. 코드 품질 및 가독성
@@ -119,6 +105,22 @@ JSON 형식으로 응답해주세요:
     "maintainability": "유지보수성 평가",
     "improvement_priority": ["개선 우선순위 항목들"]
 }}
+
+파일: {file_path} ({language})
+코드:
+```{language}
+{fit_code(code)}
+```
+
+기본 분석 결과:
+- 라인 수: {metrics.get('lines_of_code', 0)}
+- 함수 수: {metrics.get('functions', 0)}
+- 클래스 수: {metrics.get('classes', 0)}
+- 복잡도: {metrics.get('complexity', 0)}
+- 품질 점수: {basic_analysis.get('quality_score', 0)}
+
+발견된 이슈:
+{chr(10).join([f"- {issue.get('type', 'unknown')}: {issue.get('message', '')}" for issue in issues[:5]])}
 """
         return prompt
     
@@ -136,11 +138,14 @@ JSON 형식으로 응답해주세요:
 
 구체적이고 실행 가능한 제안을 제공하세요. JSON 형식으로 정확히 응답하세요."""
     
-    async def _call_llm(self, prompt: str, system_prompt: str = None) -> str:
-        """LLM 호출"""
+    async def _call_llm(self, prompt: str, system_prompt: str = None, site: str = None) -> str:
+        """LLM 호출 (비동기 클라이언트 - 공유 속도 제한 적용, 이벤트 루프를 막지 않음)
+        
+        site: 호출 위치 이름 (호출 위치별 토큰 / 지연 통계, LLM_CACHE_TTLS에 등록된 경우 디스크 응답 캐시 사용)
+        """
         try:
             messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat(messages, system=system_prompt)
+            response = await self.llm_client.achat(messages, system=system_prompt, site=site)
             return response
         except Exception as e:
             logger.error(f"LLM 호출 실패: {e}")
@@ -254,19 +259,9 @@ JSON 형식으로 응답해주세요:
     ) -> Optional[Dict[str, Any]]:
         """상세 제안 생성"""
         try:
+            # 고정 지시 -> 코드/분석 (같은 파일의 항목들이 공유) -> 항목 순: 공급자 프롬프트 캐시가 앞부분을 재사용
             prompt = f"""
-다음 개선 항목에 대한 구체적인 제안을 해주세요:
-
-개선 항목: {item}
-
-현재 코드:
-```{basic_analysis.get('language', 'unknown')}
-{code}
-```
-
-분석 결과:
-- 품질 점수: {basic_analysis.get('quality_score', 0)}
-- 복잡도: {basic_analysis.get('metrics', {}).get('complexity', 0)}
+아래 코드의 개선 항목에 대한 구체적인 제안을 해주세요.
 
 다음 형식으로 응답해주세요:
 {{
@@ -280,9 +275,20 @@ JSON 형식으로 응답해주세요:
     "benefits": ["개선 효과들"],
     "steps": ["구현 단계들"]
 }}
+
+현재 코드:
+```{basic_analysis.get('language', 'unknown')}
+{fit_code(code)}
+```
+
+분석 결과:
+- 품질 점수: {basic_analysis.get('quality_score', 0)}
+- 복잡도: {basic_analysis.get('metrics', {}).get('complexity', 0)}
+
+개선 항목: {item}
 """
             
-            response = await self._call_llm(prompt, self._get_suggestion_system_prompt())
+            response = await self._call_llm(prompt, self._get_suggestion_system_prompt(), site="suggestion")
             suggestion_data = self._parse_ai_response(response)
             
             if "title" in suggestion_data:
@@ -308,14 +314,7 @@ JSON 형식으로 응답해주세요:
         """성능 최적화 제안 생성"""
         try:
             prompt = f"""
-성능 이슈 해결 방안을 제안해주세요:
-
-이슈: {issue}
-
-코드:
-```python
-{code}
-```
+아래 코드의 성능 이슈 해결 방안을 제안해주세요.
 
 다음 형식으로 응답해주세요:
 {{
@@ -327,9 +326,16 @@ JSON 형식으로 응답해주세요:
     "performance_gain": "예상 성능 개선",
     "trade_offs": ["트레이드오프 사항들"]
 }}
+
+코드:
+```python
+{fit_code(code)}
+```
+
+이슈: {issue}
 """
             
-            response = await self._call_llm(prompt, self._get_performance_system_prompt())
+            response = await self._call_llm(prompt, self._get_performance_system_prompt(), site="performance")
             suggestion_data = self._parse_ai_response(response)
             
             if "title" in suggestion_data:
@@ -353,14 +359,7 @@ JSON 형식으로 응답해주세요:
         """보안 제안 생성"""
         try:
             prompt = f"""
-보안 취약점 해결 방안을 제안해주세요:
-
-보안 우려사항: {concern}
-
-코드:
-```python
-{code}
-```
+아래 코드의 보안 취약점 해결 방안을 제안해주세요.
 
 다음 형식으로 응답해주세요:
 {{
@@ -372,9 +371,16 @@ JSON 형식으로 응답해주세요:
     "vulnerability_type": "취약점 유형",
     "mitigation": "완화 방안"
 }}
+
+코드:
+```python
+{fit_code(code)}
+```
+
+보안 우려사항: {concern}
 """
             
-            response = await self._call_llm(prompt, self._get_security_system_prompt())
+            response = await self._call_llm(prompt, self._get_security_system_prompt(), site="security")
             suggestion_data = self._parse_ai_response(response)
             
             if "title" in suggestion_data:
@@ -398,14 +404,7 @@ JSON 형식으로 응답해주세요:
         """디자인 패턴 제안 생성"""
         try:
             prompt = f"""
-다음 디자인 패턴을 적용한 코드를 제안해주세요:
-
-패턴: {pattern}
-
-현재 코드:
-```python
-{code}
-```
+아래 코드에 디자인 패턴을 적용한 코드를 제안해주세요.
 
 다음 형식으로 응답해주세요:
 {{
@@ -417,9 +416,16 @@ JSON 형식으로 응답해주세요:
     "pattern_benefits": ["패턴 적용 효과들"],
     "implementation_steps": ["구현 단계들"]
 }}
+
+현재 코드:
+```python
+{fit_code(code)}
+```
+
+패턴: {pattern}
 """
             
-            response = await self._call_llm(prompt, self._get_pattern_system_prompt())
+            response = await self._call_llm(prompt, self._get_pattern_system_prompt(), site="pattern")
             suggestion_data = self._parse_ai_response(response)
             
             if "title" in suggestion_data:
@@ -490,7 +496,7 @@ SOLID 원칙과 GoF 디자인 패턴을 활용하여 확장 가능하고 유지
                 current_code, file_path, user_context, cursor_position
             )
             
-            response = await self._call_llm(context_prompt, self._get_context_system_prompt())
+            response = await self._call_llm(context_prompt, self._get_context_system_prompt(), site="context")
             suggestions = self._parse_context_suggestions(response)
             
             return suggestions
@@ -507,25 +513,9 @@ SOLID 원칙과 GoF 디자인 패턴을 활용하여 확장 가능하고 유지
         cursor_position: Dict[str, int]
     ) -> str:
         """컨텍스트 프롬프트 생성"""
-        prompt = f"""
-현재 작업 중인 코드를 분석하고 컨텍스트를 고려한 제안을 해주세요:
-
-현재 파일: {file_path}
-커서 위치: {cursor_position}
-
-현재 코드:
-```python
-{current_code}
-```
-
-프로젝트 컨텍스트:
-"""
-        
-        for file_path_ctx, context_data in user_context.items():
-            if file_path_ctx != file_path:
-                prompt += f"\n{file_path_ctx}:\n```python\n{context_data['code'][:200]}...\n```"
-        
-        prompt += """
+        # 고정 지시 -> 프로젝트 컨텍스트 -> 현재 코드 -> 커서 순 (자주 바뀌는 것일수록 뒤: 프롬프트 캐시 접두사 유지)
+        prompt = """
+현재 작업 중인 코드를 분석하고 컨텍스트를 고려한 제안을 해주세요.
 
 컨텍스트를 고려하여 다음 제안들을 해주세요:
 1. 현재 위치에서 적절한 코드 완성
@@ -538,6 +528,24 @@ JSON 형식으로 응답해주세요:
     "context_suggestions": ["컨텍스트 기반 제안들"],
     "dependency_hints": ["의존성 힌트들"]
 }
+
+프로젝트 컨텍스트:
+"""
+        
+        for file_path_ctx, context_data in sorted(user_context.items()):
+            if file_path_ctx != file_path:
+                prompt += f"\n{file_path_ctx}:\n```python\n{context_data['code'][:200]}...\n```"
+        
+        prompt += f"""
+
+현재 파일: {file_path}
+
+현재 코드:
+```python
+{fit_code(current_code, focus_lines=cursor_lines(cursor_position))}
+```
+
+커서 위치: {cursor_position}
 """
         return prompt
     
@@ -0,0 +1,182 @@
+"""
+시맨틱 답변 캐시
+
+질문 임베딩의 코사인 유사도가 임계값 이상이면 이전 최종 답변을 그대로 반환한다.
+항목은 (인덱스 버전, 요청 옵션) 스코프에 묶이며 LRU + TTL로 제거된다.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.embeddings import EmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.lower().split()).strip(" ?!.")
+
+
+class SemanticAnswerCache:
+    """임베딩 유사도 기반 답변 캐시 (슬롯 행렬에 대한 벡터화 검색)"""
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._vecs: Optional[np.ndarray] = None              # (max_entries, dim), 정규화된 질문 임베딩
+        self._has_vec = np.zeros(max_entries, dtype=bool)
+        self._scope_ids = np.full(max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._entries: list = [None] * max_entries           # (normalized question, scope, result)
+        self._exact: Dict[Tuple[str, Hashable], int] = {}
+        self._scopes: Dict[Hashable, int] = {}              # 살아 있는 슬롯이 있는 스코프만
+        self._next_scope = 0
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._embedder: Optional[EmbeddingClient] = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _embed(self, questions: List[str]) -> Optional[List[np.ndarray]]:
+        if self._embedder is None:
+            self._embedder = EmbeddingClient()
+        if self._embedder.is_mock:
+            # mock 임베딩은 무작위라 유사도 비교 의미가 없음 - 정확 일치만 사용
+            return None
+        vecs = np.asarray(self._embedder.embed(questions), dtype=np.float32)
+        return list(vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-9))
+
+    def _scope_id(self, scope: Hashable) -> int:
+        if scope not in self._scopes:
+            self._scopes[scope] = self._next_scope
+            self._next_scope += 1
+        return self._scopes[scope]
+
+    async def lookup(self, question: str, scope: Hashable) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """(캐시된 결과 또는 None, 질문 임베딩) - 임베딩은 store에 재사용"""
+        return (await self.lookup_many([question], scope))[0]
+
+    async def lookup_many(
+        self, questions: List[str], scope: Hashable
+    ) -> List[Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]]:
+        """질문별 lookup 결과 - 정확 일치가 아닌 질문들은 임베딩 호출 한 번으로 함께 비교"""
+        results: List[Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]] = [(None, None)] * len(questions)
+        now = time.time()
+        pending = []
+        with self._lock:
+            for i, question in enumerate(questions):
+                slot = self._exact.get((_normalize(question), scope))
+                if slot is not None and self._expires[slot] > now:
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    results[i] = (self._entries[slot][2], None)
+                else:
+                    pending.append(i)
+        if not pending:
+            return results
+
+        vecs = await asyncio.to_thread(self._embed, [questions[i] for i in pending])
+        with self._lock:
+            for n, i in enumerate(pending):
+                vec = vecs[n] if vecs is not None else None
+                hit = self._semantic_hit(vec, scope, now) if vec is not None else None
+                if hit is None:
+                    self.misses += 1
+                    results[i] = (None, vec)
+                else:
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    results[i] = (hit, vec)
+        return results
+
+    def _semantic_hit(self, vec: np.ndarray, scope: Hashable, now: float) -> Optional[Dict[str, Any]]:
+        # self._lock 안에서 호출
+        if self._vecs is None or scope not in self._scopes:
+            return None
+        mask = self._has_vec & (self._scope_ids == self._scopes[scope]) & (self._expires > now)
+        if not mask.any():
+            return None
+        sims = np.where(mask, self._vecs @ vec, -1.0)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        self._lru.move_to_end(best)
+        return self._entries[best][2]
+
+    def store(self, question: str, scope: Hashable, result: Dict[str, Any], vec: Optional[np.ndarray] = None) -> None:
+        key = (_normalize(question), scope)
+        with self._lock:
+            slot = self._exact.get(key)
+            if slot is None:
+                slot = self._allocate()
+            self._entries[slot] = (key[0], scope, result)
+            self._exact[key] = slot
+            self._scope_ids[slot] = self._scope_id(scope)
+            self._expires[slot] = time.time() + self.ttl
+            if vec is not None:
+                if self._vecs is None:
+                    self._vecs = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._vecs[slot] = vec
+                self._has_vec[slot] = True
+            else:
+                self._has_vec[slot] = False
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def _allocate(self) -> int:
+        if not self._free:
+            now = time.time()
+            expired = [s for s in self._lru if self._expires[s] <= now]
+            for s in expired or [next(iter(self._lru))]:
+                self._release(s)
+        return self._free.pop()
+
+    def _release(self, slot: int) -> None:
+        question, scope, _ = self._entries[slot]
+        self._exact.pop((question, scope), None)
+        self._entries[slot] = None
+        self._has_vec[slot] = False
+        self._scope_ids[slot] = -1
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+        # 인덱스 버전마다 새 스코프가 생기므로, 마지막 슬롯이 빠진 스코프는 지운다
+        if scope in self._scopes and not (self._scope_ids == self._scopes[scope]).any():
+            del self._scopes[scope]
+
+    def invalidate(self) -> None:
+        """전체 삭제 (인덱스 버전 스코프로 자동 무효화되지만 메모리 회수용)"""
+        with self._lock:
+            for slot in list(self._lru):
+                self._release(slot)
+            self._scopes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# 전역 답변 캐시 인스턴스
+answer_cache = SemanticAnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+)
@@ -0,0 +1,171 @@
+"""
+프롬프트용 코드 축소
+
+토큰 예산(CODE_PROMPT_TOKEN_BUDGET)을 넘는 파일은 전체 대신
+AST 개요(클래스/함수 시그니처와 라인 범위) + 커서/변경 위치 주변 함수들만 보낸다.
+파일 크기와 무관하게 LLM 호출의 토큰 수(비용/지연)가 예산 안에 머문다.
+"""
+
+import ast
+import difflib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.metrics import metrics
+from app.tokens import count_tokens, truncate_tokens
+
+Block = Tuple[int, int]  # (시작 라인, 끝 라인), 1부터 시작, 끝 포함
+
+
+def changed_lines(old: Optional[str], new: str) -> List[int]:
+    """이전 스냅샷 대비 새 코드에서 바뀌거나 추가된 라인 번호"""
+    if not old:
+        return []
+    lines = []
+    matcher = difflib.SequenceMatcher(None, old.splitlines(), new.splitlines(), autojunk=False)
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            # 삭제만 된 경우에도 삭제 지점은 포함
+            lines.extend(range(j1 + 1, max(j2, j1 + 1) + 1))
+    return lines
+
+
+def cursor_lines(cursor_position: Optional[Dict[str, int]]) -> List[int]:
+    """커서 위치 -> 포커스 라인 (웹소켓 세션의 cursor_position.line은 0부터 시작)"""
+    if not cursor_position or cursor_position.get("line") is None:
+        return []
+    return [cursor_position["line"] + 1]
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(b) for b in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    return f"{prefix} {node.name}({ast.unparse(node.args)})"
+
+
+def _parse(code: str) -> Tuple[List[str], List[Block]]:
+    """AST 개요 라인과 후보 블록(모듈/클래스 직속 함수)"""
+    tree = ast.parse(code)
+    outline: List[str] = []
+    blocks: List[Block] = []
+
+    def visit(nodes: Iterable[ast.stmt], depth: int) -> None:
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                outline.append(f"{'    ' * depth}L{start}-{node.end_lineno} {_signature(node)}")
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, depth + 1)
+                else:
+                    blocks.append((start, node.end_lineno))
+            elif depth == 0 and isinstance(node, (ast.Import, ast.ImportFrom)):
+                outline.append(f"L{node.lineno} {ast.unparse(node)}")
+
+    visit(tree.body, 0)
+    return outline, blocks
+
+
+def _distance(block: Block, focus: List[int]) -> int:
+    start, end = block
+    return min(0 if start <= line <= end else min(abs(line - start), abs(line - end)) for line in focus)
+
+
+def _render(lines: List[str], spans: List[Block]) -> str:
+    """선택된 라인 범위를 순서대로 출력하고 사이의 생략 구간을 표시"""
+    out: List[str] = []
+    cursor = 1
+    for start, end in sorted(spans):
+        if start > cursor:
+            out.append(f"... (L{cursor}-{start - 1} 생략)")
+        out.extend(lines[start - 1:end])
+        cursor = end + 1
+    if cursor <= len(lines):
+        out.append(f"... (L{cursor}-{len(lines)} 생략)")
+    return "\n".join(out)
+
+
+def _merge(lines: List[str], spans: List[Block]) -> List[Block]:
+    """겹치거나 빈 줄만 사이에 둔 범위는 합친다"""
+    merged: List[Block] = []
+    for start, end in sorted(spans):
+        if merged and all(not line.strip() for line in lines[merged[-1][1]:start - 1]):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _line_window(lines: List[str], focus: List[int], budget: int) -> List[Block]:
+    """포커스 라인에서 위아래로 예산이 찰 때까지 확장한 라인 범위 (AST를 쓸 수 없거나 함수 하나가 예산보다 클 때)"""
+    center = min(max(focus[0], 1), len(lines)) if focus else 1
+    start = end = center
+    used = count_tokens(lines[center - 1]) + 1
+    while start > 1 or end < len(lines):
+        grew = False
+        for nxt in (end + 1, start - 1):
+            if 1 <= nxt <= len(lines) and not start <= nxt <= end:
+                cost = count_tokens(lines[nxt - 1]) + 1
+                if used + cost > budget:
+                    return [(start, end)]
+                used += cost
+                start, end = min(start, nxt), max(end, nxt)
+                grew = True
+        if not grew:
+            break
+    return [(start, end)]
+
+
+def fit_code(code: str, budget: Optional[int] = None, focus_lines: Optional[List[int]] = None) -> str:
+    """토큰 예산 안에 들어가도록 코드를 축소
+
+    예산 이내면 원본 그대로. 넘으면 AST 개요(예산의 최대 1/3)와
+    포커스 라인(커서/변경 위치)에 가까운 함수부터 예산이 찰 때까지 포함한다.
+    포커스가 없으면 파일 앞쪽 함수부터. 파싱할 수 없는 코드는 포커스 주변 라인 창을 보낸다.
+    """
+    budget = budget or settings.CODE_PROMPT_TOKEN_BUDGET
+    if not code:
+        return code
+    total = count_tokens(code)
+    if total <= budget:
+        return code
+
+    metrics.incr("prompt.code.trimmed")
+    metrics.observe("prompt.code.trimmed_tokens", total - budget)
+    lines = code.splitlines()
+    focus = [line for line in (focus_lines or []) if 1 <= line <= len(lines)]
+    header = f"[파일 축소됨: 전체 {len(lines)}줄 / 약 {total}토큰 중 개요와 관련 부분만 포함]"
+
+    try:
+        outline, blocks = _parse(code)
+    except (SyntaxError, ValueError):
+        body = _render(lines, _line_window(lines, focus, budget - count_tokens(header)))
+        return f"{header}\n{body}"
+
+    outline_text = "\n".join(outline)
+    if count_tokens(outline_text) > budget // 3:
+        # 잘린 마지막 줄은 버린다
+        outline_text = truncate_tokens(outline_text, budget // 3).rsplit("\n", 1)[0]
+    left = budget - count_tokens(header) - count_tokens(outline_text) - 16
+    if focus:
+        ranked = sorted(blocks, key=lambda b: (_distance(b, focus), b[0]))
+    else:
+        ranked = sorted(blocks)
+
+    spans: List[Block] = []
+    for start, end in ranked:
+        cost = count_tokens("\n".join(lines[start - 1:end])) + 8  # 생략 표시 몫
+        if cost > left:
+            if not spans and focus:
+                # 포커스를 담은 함수 하나가 예산보다 크면 그 안에서 라인 창으로 자른다
+                window = _line_window(lines[start - 1:end], [focus[0] - start + 1], left)
+                spans = [(start + s - 1, start + e - 1) for s, e in window]
+                break
+            continue
+        spans.append((start, end))
+        left -= cost
+    if not spans:
+        spans = _line_window(lines, focus, left)
+
+    return f"{header}\n개요:\n{outline_text}\n\n코드:\n{_render(lines, _merge(lines, spans))}"
@@ -9,8 +9,9 @@ from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import json
 
-from ..llm import LLMClient
+from ..routing import llm_router
 from .ai_coding_assistant import AICodingAssistant
+from .code_context import changed_lines, cursor_lines, fit_code
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,7 @@ class InteractiveAssistant:
     """인터랙티브 AI 어시스턴트"""
     
     def __init__(self):
-        self.llm_client = LLMClient()
+        self.llm_client = llm_router  # 호출 위치(site)별 배포로 라우팅
         self.ai_coding_assistant = AICodingAssistant()
         self.conversation_sessions = {}  # 세션별 대화 기록
         self.code_snapshots = {}  # 코드 스냅샷 저장
@@ -111,13 +112,10 @@ class InteractiveAssistant:
     async def _analyze_message_type(self, message: str, current_code: str = None) -> str:
         """메시지 유형 분석"""
         try:
+            # 프롬프트 공통 배치: 고정 지시 / 응답 형식 -> 코드 등 컨텍스트 -> 사용자 메시지
+            # (매번 바뀌는 메시지를 맨 뒤에 두어 공급자 프롬프트 캐시가 앞부분을 재사용)
             prompt = f"""
-다음 사용자 메시지의 유형을 분석해주세요:
-
-메시지: "{message}"
-
-현재 코드가 있는 경우:
-{current_code[:200] + "..." if current_code and len(current_code) > 200 else current_code or "없음"}
+아래 사용자 메시지의 유형을 분석해주세요.
 
 다음 유형 중 하나로 분류해주세요:
 1. code_question - 코드에 대한 질문
@@ -129,9 +127,14 @@ class InteractiveAssistant:
 
 JSON 형식으로 응답:
 {{"type": "분류된_유형", "confidence": 0.9, "reasoning": "분류 이유"}}
+
+현재 코드가 있는 경우:
+{current_code[:200] + "..." if current_code and len(current_code) > 200 else current_code or "없음"}
+
+메시지: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_classification_system_prompt())
+            response = await self._call_llm(prompt, self._get_classification_system_prompt(), site="classification")
             result = self._parse_ai_response(response)
             
             return result.get("type", "general_conversation")
@@ -143,20 +146,10 @@ JSON 형식으로 응답:
     async def _handle_code_question(self, message: str, user_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
         """코드 질문 처리"""
         try:
-            current_code = session["current_context"].get("current_code", "")
             file_path = session["current_context"].get("file_path", "")
             
             prompt = f"""
-사용자가 코드에 대해 질문했습니다:
-
-질문: "{message}"
-
-현재 코드:
-```python
-{current_code}
-```
-
-파일: {file_path}
+사용자가 코드에 대해 질문했습니다.
 
 질문에 대해 정확하고 도움이 되는 답변을 제공해주세요. 
 코드의 특정 부분을 참조하고, 예시나 개선 제안이 있다면 포함하세요.
@@ -168,9 +161,18 @@ JSON 형식으로 응답:
     "suggestions": ["개선 제안들"],
     "references": ["참조할 코드 라인들"]
 }}
+
+현재 코드:
+```python
+{self._prompt_code(session)}
+```
+
+파일: {file_path}
+
+질문: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_code_question_system_prompt())
+            response = await self._call_llm(prompt, self._get_code_question_system_prompt(), site="code_question")
             result = self._parse_ai_response(response)
             
             return {
@@ -188,20 +190,10 @@ JSON 형식으로 응답:
     async def _handle_code_request(self, message: str, user_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
         """코드 작성 요청 처리"""
         try:
-            current_code = session["current_context"].get("current_code", "")
             file_path = session["current_context"].get("file_path", "")
             
             prompt = f"""
-사용자가 코드 작성을 요청했습니다:
-
-요청: "{message}"
-
-현재 코드 컨텍스트:
-```python
-{current_code}
-```
-
-파일: {file_path}
+사용자가 코드 작성을 요청했습니다.
 
 요청에 맞는 코드를 작성해주세요. 다음을 포함하세요:
 1. 요청사항을 정확히 구현한 코드
@@ -217,9 +209,18 @@ JSON 형식으로 응답:
     "usage_example": "사용 예시",
     "integration_notes": "기존 코드와의 통합 방법"
 }}
+
+현재 코드 컨텍스트:
+```python
+{self._prompt_code(session)}
+```
+
+파일: {file_path}
+
+요청: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_code_request_system_prompt())
+            response = await self._call_llm(prompt, self._get_code_request_system_prompt(), site="code_request")
             result = self._parse_ai_response(response)
             
             return {
@@ -238,20 +239,10 @@ JSON 형식으로 응답:
     async def _handle_debug_help(self, message: str, user_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
         """디버깅 도움 처리"""
         try:
-            current_code = session["current_context"].get("current_code", "")
             file_path = session["current_context"].get("file_path", "")
             
             prompt = f"""
-사용자가 디버깅 도움을 요청했습니다:
-
-요청: "{message}"
-
-문제가 있는 코드:
-```python
-{current_code}
-```
-
-파일: {file_path}
+사용자가 디버깅 도움을 요청했습니다.
 
 디버깅을 도와주세요:
 1. 잠재적인 문제점 식별
@@ -267,9 +258,18 @@ JSON 형식으로 응답:
     "fixed_code": "수정된 코드",
     "prevention_tips": ["예방 팁들"]
 }}
+
+문제가 있는 코드:
+```python
+{self._prompt_code(session)}
+```
+
+파일: {file_path}
+
+요청: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_debug_system_prompt())
+            response = await self._call_llm(prompt, self._get_debug_system_prompt(), site="debug")
             result = self._parse_ai_response(response)
             
             return {
@@ -295,17 +295,7 @@ JSON 형식으로 응답:
             analysis_result = await self.ai_coding_assistant.analyze_and_suggest(current_code, file_path, user_id)
             
             prompt = f"""
-사용자가 리팩토링을 요청했습니다:
-
-요청: "{message}"
-
-현재 코드:
-```python
-{current_code}
-```
-
-AI 분석 결과:
-{json.dumps(analysis_result.get('ai_analysis', {}), indent=2, ensure_ascii=False)}
+사용자가 리팩토링을 요청했습니다.
 
 리팩토링 제안을 해주세요:
 1. 코드 개선점 식별
@@ -321,9 +311,19 @@ AI 분석 결과:
     "refactoring_plan": ["리팩토링 계획"],
     "benefits": ["개선 효과들"]
 }}
+
+현재 코드:
+```python
+{self._prompt_code(session)}
+```
+
+AI 분석 결과:
+{json.dumps(analysis_result.get('ai_analysis', {}), indent=2, ensure_ascii=False)}
+
+요청: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_refactor_system_prompt())
+            response = await self._call_llm(prompt, self._get_refactor_system_prompt(), site="refactor")
             result = self._parse_ai_response(response)
             
             return {
@@ -342,20 +342,10 @@ AI 분석 결과:
     async def _handle_explanation_request(self, message: str, user_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
         """코드 설명 요청 처리"""
         try:
-            current_code = session["current_context"].get("current_code", "")
             file_path = session["current_context"].get("file_path", "")
             
             prompt = f"""
-사용자가 코드 설명을 요청했습니다:
-
-요청: "{message}"
-
-설명할 코드:
-```python
-{current_code}
-```
-
-파일: {file_path}
+사용자가 코드 설명을 요청했습니다.
 
 코드를 자세히 설명해주세요:
 1. 전체적인 목적과 기능
@@ -371,9 +361,18 @@ AI 분석 결과:
     "logic_flow": "로직 흐름 설명",
     "key_points": ["중요한 포인트들"]
 }}
+
+설명할 코드:
+```python
+{self._prompt_code(session)}
+```
+
+파일: {file_path}
+
+요청: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_explanation_system_prompt())
+            response = await self._call_llm(prompt, self._get_explanation_system_prompt(), site="explanation")
             result = self._parse_ai_response(response)
             
             return {
@@ -396,16 +395,7 @@ AI 분석 결과:
             recent_messages = session["messages"][-5:]  # 최근 5개 메시지
             
             prompt = f"""
-사용자와의 일반 대화를 처리해주세요:
-
-현재 메시지: "{message}"
-
-최근 대화 히스토리:
-{self._format_message_history(recent_messages)}
-
-현재 작업 컨텍스트:
-- 파일: {session["current_context"].get("file_path", "없음")}
-- 코드 길이: {len(session["current_context"].get("current_code", ""))} 문자
+사용자와의 일반 대화를 처리해주세요.
 
 도움이 되고 친근한 답변을 제공해주세요.
 
@@ -415,9 +405,18 @@ AI 분석 결과:
     "suggestions": ["도움 제안들"],
     "follow_up_questions": ["후속 질문들"]
 }}
+
+최근 대화 히스토리:
+{self._format_message_history(recent_messages)}
+
+현재 작업 컨텍스트:
+- 파일: {session["current_context"].get("file_path", "없음")}
+- 코드 길이: {len(session["current_context"].get("current_code", ""))} 문자
+
+현재 메시지: "{message}"
 """
             
-            response = await self._call_llm(prompt, self._get_conversation_system_prompt())
+            response = await self._call_llm(prompt, self._get_conversation_system_prompt(), site="conversation")
             result = self._parse_ai_response(response)
             
             return {
@@ -431,6 +430,18 @@ AI 분석 결과:
             logger.error(f"일반 대화 처리 실패: {e}")
             return {"content": "죄송합니다. 잠시 문제가 있었습니다.", "type": "error"}
     
+    def _prompt_code(self, session: Dict[str, Any]) -> str:
+        """프롬프트에 넣을 현재 코드 (토큰 예산 초과 시 커서 / 직전 스냅샷 대비 변경 위치 중심으로 축소)"""
+        current = session["current_context"]
+        code = current.get("current_code", "")
+        previous = next(
+            (snap["code"] for snap in reversed(session["code_history"])
+             if snap.get("file_path") == current.get("file_path") and snap["code"] != code),
+            None
+        )
+        focus = cursor_lines(current.get("cursor_position")) + changed_lines(previous, code)
+        return fit_code(code, focus_lines=focus)
+    
     def _format_message_history(self, messages: List[Dict[str, Any]]) -> str:
         """메시지 히스토리 포맷팅"""
         formatted = []
@@ -440,11 +451,14 @@ AI 분석 결과:
             formatted.append(f"{role}: {content}")
         return "\n".join(formatted)
     
-    async def _call_llm(self, prompt: str, system_prompt: str = None) -> str:
-        """LLM 호출"""
+    async def _call_llm(self, prompt: str, system_prompt: str = None, site: str = None) -> str:
+        """LLM 호출 (비동기 클라이언트 - 공유 속도 제한 적용, 이벤트 루프를 막지 않음)
+        
+        site: 호출 위치 이름 (호출 위치별 토큰 / 지연 통계 및 응답 캐시 키)
+        """
         try:
             messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat(messages, system=system_prompt)
+            response = await self.llm_client.achat(messages, system=system_prompt, site=site)
             return response
         except Exception as e:
             logger.error(f"LLM 호출 실패: {e}")
@@ -0,0 +1,271 @@
+"""
+쿼리 히스토리 서비스 (write-behind)
+
+요청 경로에서는 메모리 링 버퍼에 append만 하고, 백그라운드 태스크가 배치 단위로
+SQLite 또는 PostgreSQL에 기록한다. 조회는 (created_at, id) 키셋 페이지네이션을 사용한다.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import db_manager
+from app.ingest import index_version
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("user_id", "created_at", "question", "answer", "contexts", "timings", "processing_time", "index_version")
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    contexts TEXT,
+    timings TEXT,
+    processing_time REAL,
+    index_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_query_history_user_time ON query_history(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_query_history_time ON query_history(created_at DESC, id DESC);
+"""
+
+_POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(100) NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    contexts JSONB,
+    timings JSONB,
+    processing_time DOUBLE PRECISION,
+    index_version VARCHAR(100)
+);
+CREATE INDEX IF NOT EXISTS idx_query_history_user_time ON query_history(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_query_history_time ON query_history(created_at DESC, id DESC);
+"""
+
+
+def _encode_cursor(created_at: float, row_id: int) -> str:
+    return f"{created_at!r}:{row_id}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    created_at, row_id = cursor.rsplit(":", 1)
+    return float(created_at), int(row_id)
+
+
+class QueryHistoryStore:
+    """쿼리 히스토리 저장소"""
+
+    def __init__(
+        self,
+        backend: str = "sqlite",
+        db_path: str = "",
+        buffer_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.backend = backend
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.written = 0
+
+    # ---- 요청 경로 (논블로킹) ----
+
+    def record(
+        self,
+        question: str,
+        result: Dict[str, Any],
+        processing_time: float,
+        user_id: Optional[str] = None,
+    ) -> None:
+        """히스토리 항목을 버퍼에 추가 (가득 차면 가장 오래된 항목을 버림)"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((
+            user_id or "anonymous",
+            time.time(),
+            question,
+            result.get("final", ""),
+            # 청크 본문은 인덱스 버전으로 재현 가능하므로 출처/점수만 저장
+            json.dumps([{"source": c.get("source"), "score": c.get("score")} for c in result.get("contexts", [])]),
+            json.dumps((result.get("metrics") or {}).get("timings", {})),
+            processing_time,
+            index_version(),
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    # ---- 백그라운드 플러시 ----
+
+    async def start(self) -> None:
+        """스키마 생성 후 플러시 태스크 시작"""
+        if self.backend == "postgres":
+            async with db_manager.get_connection() as conn:
+                await conn.execute(_POSTGRES_SCHEMA)
+        else:
+            await asyncio.to_thread(self._sqlite_init)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"쿼리 히스토리 write-behind 시작 (backend={self.backend})")
+
+    async def stop(self) -> None:
+        """플러시 태스크 종료 및 남은 항목 기록"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                await self.flush()
+
+    async def flush(self) -> int:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        if not batch:
+            return 0
+        try:
+            if self.backend == "postgres":
+                async with db_manager.get_connection() as conn:
+                    await conn.executemany(
+                        f"INSERT INTO query_history ({', '.join(_COLUMNS)}) "
+                        "VALUES ($1, $2, $3, $4, $5::jsonb, $6::jsonb, $7, $8)",
+                        batch,
+                    )
+            else:
+                await asyncio.to_thread(self._sqlite_write, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"쿼리 히스토리 기록 실패 ({len(batch)}건 유실): {e}")
+        return len(batch)
+
+    # ---- 조회 ----
+
+    async def fetch_page(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """최신순 조회. 다음 페이지는 반환된 next_cursor로 요청"""
+        after = _decode_cursor(cursor) if cursor else None
+        if self.backend == "postgres":
+            rows = await self._postgres_read(limit, after, user_id)
+        else:
+            rows = await asyncio.to_thread(self._sqlite_read, limit, after, user_id)
+        items = []
+        for row in rows:
+            item = dict(row)
+            for key in ("contexts", "timings"):
+                if isinstance(item.get(key), str):
+                    item[key] = json.loads(item[key])
+            items.append(item)
+        next_cursor = _encode_cursor(items[-1]["created_at"], items[-1]["id"]) if len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    # ---- SQLite ----
+
+    def _sqlite_connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _sqlite_init(self) -> None:
+        conn = self._sqlite_connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # 기록 중에도 조회 가능
+            conn.executescript(_SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    def _sqlite_write(self, batch: List[tuple]) -> None:
+        conn = self._sqlite_connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO query_history ({', '.join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+        finally:
+            conn.close()
+
+    def _sqlite_read(self, limit: int, after: Optional[Tuple[float, int]], user_id: Optional[str]) -> List[sqlite3.Row]:
+        where, params = [], []
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if after:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        sql = "SELECT id, " + ", ".join(_COLUMNS) + " FROM query_history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        conn = self._sqlite_connect()
+        try:
+            return conn.execute(sql, (*params, limit)).fetchall()
+        finally:
+            conn.close()
+
+    # ---- PostgreSQL ----
+
+    async def _postgres_read(self, limit: int, after: Optional[Tuple[float, int]], user_id: Optional[str]):
+        where, params = [], []
+        if user_id:
+            params.append(user_id)
+            where.append(f"user_id = ${len(params)}")
+        if after:
+            params.extend(after)
+            where.append(f"(created_at, id) < (${len(params) - 1}, ${len(params)})")
+        params.append(limit)
+        sql = "SELECT id, " + ", ".join(_COLUMNS) + " FROM query_history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY created_at DESC, id DESC LIMIT ${len(params)}"
+        async with db_manager.get_connection() as conn:
+            return await conn.fetch(sql, *params)
+
+
+# 전역 쿼리 히스토리 인스턴스
+query_history = QueryHistoryStore(
+    backend=settings.QUERY_HISTORY_BACKEND,
+    db_path=settings.QUERY_HISTORY_DB,
+    buffer_size=settings.QUERY_HISTORY_BUFFER_SIZE,
+    batch_size=settings.QUERY_HISTORY_BATCH_SIZE,
+    flush_interval=settings.QUERY_HISTORY_FLUSH_INTERVAL,
+)
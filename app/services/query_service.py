@@ -2,29 +2,45 @@
 쿼리 처리 서비스
 """
 
+import asyncio
+import contextlib
 import logging
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, AsyncIterator, Tuple
 from datetime import datetime
 
-from app.graph import build_graph
+from app.graph import get_app
 from app.agents.state import AgentState
-from app.core.exceptions import QueryProcessingError, LLMServiceError, ToolExecutionError
+from app.agents.report_agent import stream_answer
+from app.agents.rag_agent import retrieve_batch
+from app.core.exceptions import QueryProcessingError, QueryTimeoutError, ServiceOverloadedError, LLMServiceError, ToolExecutionError
+from app.core.config import settings
+from app.ingest import index_version
+from app.metrics import metrics, new_trace, bind_trace, unbind_trace
+from app.config import DEADLINE_REPORT_RESERVE
+from app.deadline import deadline_after, bind_deadline, unbind_deadline, remaining, has_budget, stage_timeout
+from app.services.answer_cache import answer_cache
+from app.services.admission import admission, at_least
 
 logger = logging.getLogger(__name__)
 
+# 답변을 캐시해도 되는 생략 단계 (답변 자체는 축소되지 않음)
+_CACHEABLE_DEGRADATIONS = {"rewrite"}
+
 class QueryService:
     """쿼리 처리 서비스"""
     
     def __init__(self):
-        self.graph = None
         self.app = None
+        self.ready = False
+        self.warm_up_attempts = 0
+        self.warm_up_error: str | None = None
     
     def _get_graph_app(self):
-        """그래프 앱 인스턴스 가져오기"""
+        """그래프 앱 인스턴스 가져오기 (프로세스 전역 컴파일 그래프)"""
         if self.app is None:
             try:
-                self.graph = build_graph()
-                self.app = self.graph.compile()
+                self.app = get_app()
                 logger.info("LangGraph 앱 초기화 완료")
             except Exception as e:
                 logger.error(f"LangGraph 앱 초기화 실패: {e}")
@@ -34,31 +50,158 @@ class QueryService:
                 )
         return self.app
     
+    def _admit(self, deadline: float):
+        """어드미션 슬롯 (비활성화 시 항상 normal 모드) - 대기는 데드라인을 넘지 않음"""
+        if not settings.ADMISSION_ENABLED:
+            return contextlib.nullcontext("normal")
+        return admission.admit(max_wait=remaining(deadline))
+    
+    def warm_up(self) -> None:
+        """그래프 컴파일, 인덱스 로드, LLM 클라이언트 생성을 미리 수행 (실패 시 예외)"""
+        from app.agents.rag_agent import _bm25_index, _faiss_store
+        from app.llm import get_llm_client
+        from app.routing import llm_router
+        from app.tokens import count_tokens
+
+        self.warm_up_attempts += 1
+        try:
+            self._get_graph_app()
+            _bm25_index()
+            _faiss_store()
+            for deployment in {d for chain in llm_router.routes.values() for d in chain}:
+                get_llm_client(deployment)
+            count_tokens("warm-up")  # tiktoken 인코딩 로드
+        except Exception as e:
+            self.warm_up_error = f"{type(e).__name__}: {e}"
+            raise
+        self.warm_up_error = None
+        self.ready = True
+        logger.info("쿼리 서비스 워밍업 완료")
+    
+    async def warm_up_until_ready(self) -> None:
+        """워밍업이 성공할 때까지 지수 백오프로 재시도 (레디니스가 503에 고정되지 않도록)"""
+        delay = 1.0
+        while not self.ready:
+            try:
+                await asyncio.to_thread(self.warm_up)
+            except Exception as e:
+                logger.error(f"쿼리 서비스 워밍업 실패 (시도 {self.warm_up_attempts}회, {delay:.0f}초 후 재시도): {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.WARM_UP_RETRY_MAX_DELAY)
+    
+    def warm_up_stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "attempts": self.warm_up_attempts, "last_error": self.warm_up_error}
+    
     async def process_query(
         self,
         question: str,
         include_context: bool = True,
         include_tools: bool = True,
-        max_contexts: int = 5
+        max_contexts: int = 5,
+        contexts: List[Dict[str, Any]] | None = None,
+        use_cache: bool = True,
+        timeout: float | None = None,
+        cache_lookup: Tuple[Dict[str, Any] | None, Any] | None = None
     ) -> Dict[str, Any]:
-        """쿼리 처리"""
+        """쿼리 처리 (contexts를 주면 검색 단계는 그 결과를 그대로 사용)
+        
+        cache_lookup: 호출자가 이미 수행한 답변 캐시 조회 결과 (결과, 질문 임베딩) - 배치용
+        
+        timeout(기본값: QUERY_TIMEOUT)초가 지나면 각 노드가 단계를 생략/축소하고,
+        유예 시간까지 끝나지 않으면 QueryTimeoutError로 중단한다.
+        """
+        deadline = deadline_after(timeout or settings.QUERY_TIMEOUT)
         try:
             logger.info(f"쿼리 처리 시작: {question[:100]}...")
             
-            # 그래프 앱 가져오기
-            app = self._get_graph_app()
-            
-            # 초기 상태 설정
-            state: AgentState = {
-                "question": question,
-                "need_rag": include_context,
-                "need_calc": False,  # 자동 감지
-                "use_sqlite": False  # 자동 감지
-            }
-            
-            # 쿼리 처리 실행
-            result = app.invoke(state, config={"recursion_limit": 10})
+            # 시맨틱 답변 캐시 (인덱스 버전 + 요청 옵션 단위)
+            use_cache = use_cache and settings.ANSWER_CACHE_ENABLED
+            cache_scope = (index_version(), include_context, include_tools)
+            question_vec = None
+            cached = None
+            started = time.perf_counter()
+            if use_cache and cache_lookup is not None:
+                # 배치: 묶음 단위로 이미 조회함 (임베딩 1회) - 그 결과와 질문 임베딩을 그대로 사용
+                cached, question_vec = cache_lookup
+            # 조회(질문 임베딩)도 데드라인 안에서: 답변 생성 몫을 남길 수 없으면 생략
+            elif use_cache and not has_budget(DEADLINE_REPORT_RESERVE, deadline):
+                metrics.incr("cache.answer.skipped")
+            elif use_cache:
+                try:
+                    cached, question_vec = await asyncio.wait_for(
+                        answer_cache.lookup(question, cache_scope),
+                        stage_timeout(DEADLINE_REPORT_RESERVE, deadline)
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("답변 캐시 조회 시간 초과 (미스로 처리)")
+                    metrics.incr("cache.answer.timeout")
+                    cached, question_vec = None, None
+                except Exception as e:
+                    # 임베딩 장애(타임아웃/429 등)는 캐시 미스로 처리 - 그래프는 여전히 답할 수 있음
+                    logger.warning(f"답변 캐시 조회 실패 (미스로 처리): {e}")
+                    metrics.incr("cache.answer.error")
+                    cached, question_vec = None, None
+                metrics.incr(f"cache.answer.{'hit' if cached else 'miss'}")
+            if cached is not None:
+                trace = new_trace()
+                trace["cache"]["answer"] = "hit"
+                trace["total_seconds"] = round(time.perf_counter() - started, 6)
+                logger.info("쿼리 처리 완료: 답변 캐시 적중")
+                return {**cached, "contexts": cached.get("contexts", [])[:max_contexts], "metrics": trace}
             
+            # 과부하 시 대기열에서 기다리거나 거절되고, 모드에 따라 단계가 생략됨
+            async with self._admit(deadline) as mode:
+                # 그래프 앱 가져오기
+                app = self._get_graph_app()
+                
+                # 초기 상태 설정
+                state: AgentState = {
+                    "question": question,
+                    "need_rag": include_context,
+                    "need_tools": include_tools,  # False면 도구 단계 생략, True면 자동 감지
+                    "deadline": deadline,
+                    "skip_rewrite": at_least(mode, "no_rewrite"),
+                    "skip_critic": at_least(mode, "no_critic"),
+                }
+                if contexts is not None:
+                    state["contexts"] = contexts
+                    state["contexts_prefetched"] = True
+                # 노드별 시간 / LLM 토큰 / 캐시 / 후보 수 기록용 트레이스
+                state["metrics"] = new_trace()
+                state["metrics"]["admission_mode"] = mode
+                
+                # 쿼리 처리 실행
+                started = time.perf_counter()
+                try:
+                    # 노드들이 데드라인에 맞춰 축소되므로 이 한도는 멈춘 호출에 대한 안전장치
+                    result = await asyncio.wait_for(
+                        app.ainvoke(state, config={"recursion_limit": 10}),
+                        remaining(deadline) + settings.QUERY_TIMEOUT_GRACE
+                    )
+                except asyncio.TimeoutError:
+                    metrics.incr("query.timeouts")
+                    raise QueryTimeoutError(
+                        message="쿼리 처리 시간이 초과되었습니다",
+                        details={"question": question, "timeout": timeout or settings.QUERY_TIMEOUT}
+                    )
+                elapsed = time.perf_counter() - started
+                metrics.observe("query.seconds", elapsed)
+                result.setdefault("metrics", state["metrics"])["total_seconds"] = round(elapsed, 6)
+                if use_cache:
+                    result["metrics"]["cache"]["answer"] = "miss"
+                    # 도구 실행 결과는 매번 달라질 수 있고, 축소된 답변은 재사용하면 안 되므로 캐시하지 않음
+                    # (단, 쿼리 재작성 생략은 검색 질의만 바뀔 뿐 답변은 완전하므로 캐시 - 과부하 중 답변이
+                    #  cached_only 모드가 의존하는 캐시에 쌓이도록)
+                    degraded = set(result["metrics"].get("degraded", ()))
+                    if not result.get("tool_results") and degraded <= _CACHEABLE_DEGRADATIONS:
+                        try:
+                            answer_cache.store(question, cache_scope, {
+                                k: result[k] for k in ("question", "final", "contexts", "plan") if k in result
+                            }, question_vec)
+                        except Exception as e:
+                            logger.warning(f"답변 캐시 저장 실패: {e}")
+                            metrics.incr("cache.answer.error")
+                
             # 결과 검증
             if not result:
                 raise QueryProcessingError(
@@ -82,6 +225,209 @@ class QueryService:
                 details={"error": str(e), "question": question}
             )
     
+    async def stream_query(
+        self,
+        question: str,
+        include_context: bool = True,
+        include_tools: bool = True,
+        max_contexts: int = 5,
+        timeout: float | None = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """쿼리 처리 스트리밍 - 노드별 진행 이벤트 후 답변 토큰을 순서대로 생성
+        
+        이벤트: plan, contexts, tool_results, token(phase=draft|revision), done
+        (done의 result는 최종 상태 - 전송 전에 라우트에서 제거)
+        """
+        state: AgentState = {
+            "question": question,
+            "need_rag": include_context,
+            "need_tools": include_tools,
+            "deadline": deadline_after(timeout or settings.QUERY_TIMEOUT),
+            "metrics": new_trace(),
+        }
+        async with self._admit(state["deadline"]) as mode:
+            state["skip_rewrite"] = at_least(mode, "no_rewrite")
+            state["skip_critic"] = at_least(mode, "no_critic")
+            state["metrics"]["admission_mode"] = mode
+            async with contextlib.aclosing(self._stream_graph(state, max_contexts, timeout or settings.QUERY_TIMEOUT)) as events:
+                async for event in events:
+                    yield event
+    
+    async def _bounded(self, events: AsyncIterator[Any], state: AgentState, timeout: float) -> AsyncIterator[Any]:
+        """process_query의 wait_for와 같은 안전장치: 다음 이벤트가 데드라인 + 유예 시간 안에 오지 않으면 중단"""
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        events.__anext__(),
+                        max(remaining(state["deadline"]), 0.0) + settings.QUERY_TIMEOUT_GRACE
+                    )
+                except StopAsyncIteration:
+                    return
+                yield item
+        except asyncio.TimeoutError:
+            metrics.incr("query.timeouts")
+            raise QueryTimeoutError(
+                message="쿼리 처리 시간이 초과되었습니다",
+                details={"question": state["question"], "timeout": timeout}
+            )
+        finally:
+            await events.aclose()
+    
+    async def _stream_graph(self, state: AgentState, max_contexts: int, timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        start_time = time.time()
+        # report 전 단계까지만 그래프로 실행하고, 답변은 토큰 단위로 직접 스트리밍
+        app = get_app(with_report=False)
+        graph_events = app.astream(state, stream_mode="updates", config={"recursion_limit": 10})
+        # aclosing: 클라이언트 연결 종료/취소 시 내부 제너레이터(업스트림 스트림, 리미터 슬롯)를 즉시 정리
+        async with contextlib.aclosing(self._bounded(graph_events, state, timeout)) as updates:
+            async for update in updates:
+                for node, node_state in update.items():
+                    if not node_state:
+                        continue
+                    state.update(node_state)
+                    if node == "plan":
+                        yield {"event": "plan", "data": {"plan": state.get("plan", [])}}
+                    elif node == "rag":
+                        yield {"event": "contexts", "data": {"contexts": state.get("contexts", [])[:max_contexts]}}
+                    elif node == "tools":
+                        yield {"event": "tool_results", "data": {"tool_results": state.get("tool_results", {})}}
+        
+        trace = state["metrics"]
+        report_start = time.perf_counter()
+        token = bind_trace(trace)
+        deadline_token = bind_deadline(state["deadline"])
+        try:
+            async with contextlib.aclosing(self._bounded(stream_answer(state), state, timeout)) as deltas:
+                async for delta in deltas:
+                    yield {"event": "token", "data": delta}
+        finally:
+            unbind_deadline(deadline_token)
+            unbind_trace(token)
+        report_elapsed = time.perf_counter() - report_start
+        trace["timings"]["report"] = round(report_elapsed, 6)
+        metrics.observe("node.report.seconds", report_elapsed)
+        metrics.observe("query.seconds", time.time() - start_time)
+        
+        yield {
+            "event": "done",
+            "data": {
+                "answer": state.get("final", ""),
+                "processing_time": time.time() - start_time,
+                "result": state,
+            },
+        }
+    
+    async def process_batch(
+        self,
+        questions: List[str],
+        include_context: bool = True,
+        include_tools: bool = True,
+        max_contexts: int = 5,
+        concurrency: int = 4,
+        timeout: float | None = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """배치 쿼리 처리 - 완료되는 순서대로 질문별 결과 생성
+        
+        중복 질문은 한 번만 처리한다. 질문을 concurrency 개씩 묶어 묶음마다 검색(재작성 +
+        배치 임베딩 + 행렬 검색)을 한 번에 수행한 뒤 그래프를 동시에 실행하고, 결과는 묶음
+        안에서 완료되는 순서대로 바로 내보낸다. 재작성 LLM 호출도 묶음 크기를 넘지 않으므로
+        큰 배치가 대화형 쿼리와 같은 배포 리미터를 독차지하지 않는다.
+        """
+        unique: Dict[str, List[int]] = {}
+        for i, q in enumerate(questions):
+            unique.setdefault(" ".join(q.split()), []).append(i)
+        uniq_questions = list(unique)
+        
+        async def run_one(q: str, ctxs, looked_up) -> Dict[str, Any]:
+            start = time.time()
+            try:
+                result = await self.process_query(
+                    question=q,
+                    include_context=include_context,
+                    include_tools=include_tools,
+                    max_contexts=max_contexts,
+                    contexts=ctxs,
+                    timeout=timeout,
+                    cache_lookup=looked_up
+                )
+                return {
+                    "question": q,
+                    "answer": result.get("final", ""),
+                    "contexts": result.get("contexts", []),
+                    "tool_results": result.get("tool_results", {}),
+                    "processing_time": time.time() - start,
+                    "metrics": result.get("metrics"),
+                }
+            except QueryProcessingError as e:
+                return {"question": q, "error": e.message, "details": e.details}
+        
+        for offset in range(0, len(uniq_questions), concurrency):
+            chunk = uniq_questions[offset:offset + concurrency]
+            looked_up = await self._lookup_answers(chunk, (index_version(), include_context, include_tools), timeout)
+            misses = [q for q, (cached, _) in zip(chunk, looked_up) if cached is None]
+            prefetched: Dict[str, Any] = {}
+            if include_context and misses:
+                prefetched = dict(zip(misses, await self._prefetch(misses, timeout)))
+            tasks = [
+                asyncio.create_task(run_one(q, prefetched.get(q), lookup))
+                for q, lookup in zip(chunk, looked_up)
+            ]
+            try:
+                for done in asyncio.as_completed(tasks):
+                    item = await done
+                    item["indices"] = unique[item["question"]]
+                    yield item
+            finally:
+                # 소비자가 중단하면 남은 질문 처리 취소
+                for t in tasks:
+                    t.cancel()
+    
+    async def _lookup_answers(self, questions: List[str], scope: Any, timeout: float | None) -> List[Any]:
+        """배치 묶음의 답변 캐시 조회 - 질문 임베딩을 한 번에 계산해 조회와 저장(store)에 재사용
+        
+        조회가 실패/시간 초과되면 질문별 (None, None) - 미스로 처리하고 process_query에서 다시 조회하지 않음
+        """
+        if not settings.ANSWER_CACHE_ENABLED:
+            return [(None, None)] * len(questions)
+        deadline = deadline_after(timeout or settings.QUERY_TIMEOUT)
+        try:
+            results = await asyncio.wait_for(
+                answer_cache.lookup_many(questions, scope),
+                stage_timeout(DEADLINE_REPORT_RESERVE, deadline)
+            )
+        except asyncio.TimeoutError:
+            logger.warning("배치 답변 캐시 조회 시간 초과 (미스로 처리)")
+            metrics.incr("cache.answer.timeout")
+            results = [(None, None)] * len(questions)
+        except Exception as e:
+            logger.warning(f"배치 답변 캐시 조회 실패 (미스로 처리): {e}")
+            metrics.incr("cache.answer.error")
+            results = [(None, None)] * len(questions)
+        for cached, _ in results:
+            metrics.incr(f"cache.answer.{'hit' if cached else 'miss'}")
+        return results
+    
+    async def _prefetch(self, questions: List[str], timeout: float | None) -> List[Any]:
+        """배치 묶음의 검색 - 어드미션 슬롯 하나를 쓰고 질문 하나의 데드라인 안에서 수행
+        
+        거절/시간 초과 시 None 목록을 반환해 질문별 검색(process_query)으로 넘긴다.
+        """
+        deadline = deadline_after(timeout or settings.QUERY_TIMEOUT)
+        token = bind_deadline(deadline)
+        try:
+            async with self._admit(deadline) as mode:
+                return await asyncio.wait_for(
+                    retrieve_batch(questions, rewrite=not at_least(mode, "no_rewrite")),
+                    remaining(deadline)
+                )
+        except (asyncio.TimeoutError, ServiceOverloadedError) as e:
+            logger.warning(f"배치 검색 생략 (질문별 검색으로 처리): {type(e).__name__}")
+            metrics.incr("batch.prefetch.skipped")
+            return [None] * len(questions)
+        finally:
+            unbind_deadline(token)
+    
     async def process_simple_query(self, question: str) -> str:
         """간단한 쿼리 처리 (답변만 반환)"""
         try:
@@ -146,3 +492,13 @@ class QueryService:
                 message="도구 실행 실패",
                 details={"error": str(e)}
             )
+
+
+_query_service: QueryService | None = None
+
+def get_query_service() -> QueryService:
+    """프로세스 전역 쿼리 서비스"""
+    global _query_service
+    if _query_service is None:
+        _query_service = QueryService()
+    return _query_service
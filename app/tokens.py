@@ -0,0 +1,40 @@
+from functools import lru_cache
+from .config import AZURE_OPENAI_DEPLOYMENT
+
+# rough chars-per-token used when tiktoken (or its BPE files) is unavailable
+_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        # BPE download failed (offline deployment)
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str, model: str = AZURE_OPENAI_DEPLOYMENT) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int, model: str = AZURE_OPENAI_DEPLOYMENT) -> str:
+    if max_tokens <= 0:
+        return ""
+    enc = _encoding(model)
+    if enc is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+    ids = enc.encode(text, disallowed_special=())
+    if len(ids) <= max_tokens:
+        return text
+    return enc.decode(ids[:max_tokens])
@@ -103,6 +103,31 @@ class FaissStore:
             logger.error(f"벡터 검색 실패: {e}")
             return []
     
+    def search_vectors(self, vectors: np.ndarray, k: int = 5) -> List[List[Dict[str, Any]]]:
+        """벡터 배치 검색 (행 하나당 쿼리 하나, 한 번의 행렬 검색)"""
+        n = len(vectors) if vectors is not None else 0
+        try:
+            if self.is_mock:
+                logger.info(f"Mock 모드: {n}개 쿼리 배치 검색 시뮬레이션")
+                return [self.search("", k) for _ in range(n)]
+            
+            if self.index is None or n == 0:
+                return [[] for _ in range(n)]
+            
+            logger.info(f"FAISS에서 {n}개 쿼리 배치 검색 (k={k})")
+            scores, ids = self.index.search(np.asarray(vectors, dtype=np.float32), k)
+            results = []
+            for row_scores, row_ids in zip(scores, ids):
+                results.append([
+                    {**self.meta[i], "score": f"{s:.4f}"}
+                    for s, i in zip(row_scores, row_ids) if 0 <= i < len(self.meta)
+                ])
+            return results
+            
+        except Exception as e:
+            logger.error(f"벡터 배치 검색 실패: {e}")
+            return [[] for _ in range(n)]
+    
     def get_stats(self) -> Dict[str, Any]:
         """스토어 통계"""
         return {
@@ -8,10 +8,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 
-from app.api.routes import query, documents, index, health, websocket, improved_demo, ui_enhancements, sandbox, enhanced_sandbox_demo, debug
+from app.api.routes import query, documents, index, health, websocket, improved_demo, ui_enhancements, sandbox, enhanced_sandbox_demo, debug, metrics
 from app.core.config import settings
 from app.core.exceptions import AgenticAIException
 
@@ -78,9 +79,36 @@ async def lifespan(app: FastAPI):
         import traceback
         logger.error(traceback.format_exc())
     
+    # 쿼리 파이프라인 워밍업 (그래프 컴파일, 인덱스, LLM 클라이언트)
+    # 실패하면 백그라운드에서 재시도하고, 그동안 /health/ready는 503 + 실패 원인
+    warm_up_task = None
+    from app.services.query_service import get_query_service
+    try:
+        await asyncio.to_thread(get_query_service().warm_up)
+    except Exception as e:
+        logger.error(f"❌ 쿼리 서비스 워밍업 실패, 백그라운드 재시도: {e}")
+        warm_up_task = asyncio.create_task(get_query_service().warm_up_until_ready())
+    
+    # 쿼리 히스토리 write-behind 태스크
+    history_started = False
+    if settings.QUERY_HISTORY_ENABLED:
+        try:
+            from app.services.query_history import query_history
+            await query_history.start()
+            history_started = True
+        except Exception as e:
+            logger.error(f"❌ 쿼리 히스토리 시작 실패: {e}")
+    
     yield
     
     # 종료 시 실행
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    if history_started:
+        from app.services.query_history import query_history
+        await query_history.stop()
+    from app.llm import aclose_llm_clients
+    await aclose_llm_clients()
     logger.info("🛑 Agentic AI FastAPI 서버 종료")
 
 # FastAPI 애플리케이션 생성
@@ -139,6 +167,7 @@ app.include_router(ui_enhancements.router, prefix="/api/v1", tags=["ui"])
 app.include_router(sandbox.router, prefix="/api/v1/sandbox", tags=["sandbox"])
 app.include_router(enhanced_sandbox_demo.router, prefix="/api/v1", tags=["demo"])
 app.include_router(debug.router, prefix="/api/v1", tags=["debug"])  # Railway 디버깅용
+app.include_router(metrics.router, prefix="/api/v1", tags=["metrics"])
 
 # 루트 엔드포인트
 @app.get("/")
@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.services.admission as admission_module
+from app.core.exceptions import ServiceOverloadedError
+from app.services.admission import AdmissionController, at_least
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(admission_module, "time", SimpleNamespace(monotonic=lambda: now.t, perf_counter=lambda: now.t))
+    return now
+
+
+def make(**kwargs) -> AdmissionController:
+    return AdmissionController(**{"max_in_flight": 1, "max_queue": 4, "queue_timeout": 1.0, "latency_levels": (8.0, 15.0, 25.0), **kwargs})
+
+
+def test_at_least_orders_modes():
+    assert at_least("cached_only", "no_critic")
+    assert at_least("no_critic", "no_rewrite")
+    assert not at_least("no_rewrite", "no_critic")
+    assert not at_least("normal", "no_rewrite")
+
+
+@pytest.mark.parametrize("latency,mode", [(0.0, "normal"), (8.0, "no_rewrite"), (15.0, "no_critic"), (30.0, "cached_only")])
+def test_mode_follows_latency(clock, latency, mode):
+    controller = make()
+    controller._ewma, controller._ewma_at = latency, clock.t
+    assert controller.mode == mode
+
+
+def test_latency_decays_while_idle(clock):
+    controller = make(ewma_half_life=30.0)
+    controller._ewma, controller._ewma_at = 30.0, clock.t
+    assert controller.mode == "cached_only"
+    clock.t += 30
+    assert controller.latency() == pytest.approx(15.0)
+    assert controller.mode == "no_critic"
+    clock.t += 60
+    assert controller.mode == "normal"
+
+
+@pytest.mark.parametrize("waiting,mode", [(0, "normal"), (1, "no_rewrite"), (2, "no_critic"), (4, "cached_only")])
+def test_mode_follows_queue_pressure(clock, waiting, mode):
+    controller = make()
+    controller.waiting = waiting
+    assert controller.mode == mode
+
+
+def test_observed_latency_moves_the_ewma(clock):
+    controller = make(ewma_alpha=0.5)
+
+    async def run():
+        async with controller.admit():
+            clock.t += 20
+    asyncio.run(run())
+    assert controller.latency() == pytest.approx(10.0)
+    assert controller.mode == "no_rewrite"
+
+
+def test_cached_only_rejects_on_arrival(clock):
+    controller = make()
+    controller._ewma, controller._ewma_at = 30.0, clock.t
+
+    async def run():
+        async with controller.admit():
+            pass
+    with pytest.raises(ServiceOverloadedError) as info:
+        asyncio.run(run())
+    assert info.value.details["reason"] == "cached_only"
+
+
+def test_queue_full_and_queue_timeout_are_rejected():
+    controller = make(max_queue=1, queue_timeout=0.05)
+
+    async def run():
+        holder_in = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with controller.admit():
+                holder_in.set()
+                await release.wait()
+
+        async def waiter():
+            async with controller.admit():
+                pass
+
+        held = asyncio.create_task(holder())
+        await holder_in.wait()
+        queued = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+        with pytest.raises(ServiceOverloadedError) as full:
+            await waiter()
+        with pytest.raises(ServiceOverloadedError) as timed_out:
+            await queued
+        release.set()
+        await held
+        return full.value.details["reason"], timed_out.value.details["reason"]
+
+    assert asyncio.run(run()) == ("queue_full", "queue_timeout")
+    assert controller.waiting == 0 and controller.in_flight == 0
+    assert controller.rejected == 2
+
+
+def test_request_queued_into_cached_only_is_rejected_after_waiting(clock):
+    controller = make(queue_timeout=5.0)
+
+    async def run():
+        holder_in = asyncio.Event()
+
+        async def holder():
+            async with controller.admit():
+                holder_in.set()
+                await asyncio.sleep(0.01)
+                # the load spikes while the second request is queued
+                clock.t += 30
+                controller._ewma, controller._ewma_at = 30.0, clock.t
+
+        async def waiter():
+            async with controller.admit() as mode:
+                return mode
+
+        held = asyncio.create_task(holder())
+        await holder_in.wait()
+        with pytest.raises(ServiceOverloadedError) as info:
+            await waiter()
+        await held
+        return info.value.details["reason"]
+
+    assert asyncio.run(run()) == "cached_only"
+    assert controller.in_flight == 0
+    assert controller._semaphore._value == 1
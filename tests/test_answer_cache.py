@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+import app.services.answer_cache as answer_cache_module
+from app.services.answer_cache import SemanticAnswerCache
+
+# fixed embeddings: the two sort questions are near-duplicates, the decorator one is unrelated
+VECTORS = {
+    "how do i sort a list": [1.0, 0.0, 0.0],
+    "how to sort a list": [0.99, 0.1, 0.0],
+    "what is a decorator": [0.0, 1.0, 0.0],
+}
+
+
+def make_cache(**kwargs) -> SemanticAnswerCache:
+    cache = SemanticAnswerCache(**{"max_entries": 8, "ttl": 60.0, "threshold": 0.95, **kwargs})
+    cache._embedder = SimpleNamespace(is_mock=False, embed=lambda qs: [VECTORS[q] for q in qs])
+    return cache
+
+
+def lookup(cache, question, scope):
+    return asyncio.run(cache.lookup(question, scope))
+
+
+def remember(cache, question, scope, answer):
+    result, vec = lookup(cache, question, scope)
+    assert result is None
+    cache.store(question, scope, {"final": answer}, vec)
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = make_cache()
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    result, _ = lookup(cache, "How do I sort a list?", "v1")
+    assert result == {"final": "sorted()"}
+    assert cache.semantic_hits == 0
+
+
+def test_semantic_hit_within_scope():
+    cache = make_cache()
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    result, _ = lookup(cache, "how to sort a list", "v1")
+    assert result == {"final": "sorted()"}
+    assert cache.semantic_hits == 1
+
+
+def test_other_scope_misses_for_exact_and_similar_questions():
+    cache = make_cache()
+    remember(cache, "how do i sort a list", ("v1", True, True), "sorted()")
+    assert lookup(cache, "how do i sort a list", ("v2", True, True))[0] is None
+    assert lookup(cache, "how to sort a list", ("v1", False, True))[0] is None
+
+
+def test_dissimilar_question_misses():
+    cache = make_cache()
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    assert lookup(cache, "what is a decorator", "v1")[0] is None
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = make_cache(ttl=10.0)
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    later = answer_cache_module.time.time() + 11
+    monkeypatch.setattr(answer_cache_module, "time", SimpleNamespace(time=lambda: later))
+    assert lookup(cache, "how do i sort a list", "v1")[0] is None
+    assert lookup(cache, "how to sort a list", "v1")[0] is None
+
+
+def test_mock_embeddings_only_match_exactly():
+    cache = SemanticAnswerCache(max_entries=4)
+    cache._embedder = SimpleNamespace(is_mock=True)
+    result, vec = lookup(cache, "how do i sort a list", "v1")
+    assert result is None and vec is None
+    cache.store("how do i sort a list", "v1", {"final": "sorted()"}, vec)
+    assert lookup(cache, "how do i sort a list", "v1")[0] == {"final": "sorted()"}
+    assert lookup(cache, "how to sort a list", "v1")[0] is None
+
+
+def test_full_cache_evicts_least_recently_used():
+    cache = make_cache(max_entries=2)
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    remember(cache, "what is a decorator", "v1", "a wrapper")
+    assert lookup(cache, "how do i sort a list", "v1")[0] is not None  # decorator is now oldest
+    cache.store("how do i sort a list", "v2", {"final": "sorted()"}, np.array(VECTORS["how do i sort a list"], dtype=np.float32))
+    assert lookup(cache, "what is a decorator", "v1")[0] is None
+    assert lookup(cache, "how do i sort a list", "v1")[0] is not None
+    assert cache.stats()["size"] == 2
+
+
+def test_lookup_many_embeds_non_exact_questions_in_one_call():
+    cache = make_cache()
+    remember(cache, "how do i sort a list", "v1", "sorted()")
+    calls = []
+    embed = cache._embedder.embed
+    cache._embedder.embed = lambda qs: calls.append(list(qs)) or embed(qs)
+    results = asyncio.run(cache.lookup_many(["how do i sort a list", "how to sort a list", "what is a decorator"], "v1"))
+    assert calls == [["how to sort a list", "what is a decorator"]]
+    assert [r for r, _ in results] == [{"final": "sorted()"}, {"final": "sorted()"}, None]
+    assert results[0][1] is None and results[2][1] is not None  # misses carry their vector for store
+
+
+def test_scopes_without_live_slots_are_dropped():
+    cache = make_cache(max_entries=2)
+    for version in range(10):
+        cache.store("how do i sort a list", f"v{version}", {"final": "sorted()"})
+    assert set(cache._scopes) == {"v8", "v9"}
+    assert lookup(cache, "how do i sort a list", "v9")[0] == {"final": "sorted()"}
+    cache.invalidate()
+    assert cache._scopes == {}
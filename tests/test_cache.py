@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+import app.cache as cache_module
+from app.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now.t))
+    return now
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # b is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entry_is_a_miss_and_dropped(clock):
+    cache = LRUCache(ttl=10)
+    cache.set("k", "v")
+    clock.t += 9
+    assert cache.get("k") == "v"
+    clock.t += 2
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_overwrite_refreshes_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.set("k", "old")
+    clock.t += 8
+    cache.set("k", "new")
+    clock.t += 8
+    assert cache.get("k") == "new"
+
+
+def test_byte_limit_evicts_oldest_until_it_fits():
+    cache = LRUCache(max_entries=100, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert cache.get("a") is None
+    assert cache.get("b") == "xxxx" and cache.get("c") == "xxxx"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_value_larger_than_byte_limit_is_not_stored():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set("small", "xx")
+    cache.set("big", "x" * 11)
+    assert cache.get("big") is None
+    assert cache.get("small") == "xx"
+    assert cache.stats()["bytes"] == 2
+
+
+def test_replacing_a_key_adjusts_byte_count():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set("k", "xxxxxx")
+    cache.set("k", "xx")
+    assert cache.stats()["bytes"] == 2
+    cache.clear()
+    assert cache.stats()["bytes"] == 0 and len(cache) == 0
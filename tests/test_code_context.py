@@ -0,0 +1,76 @@
+from app.services.code_context import changed_lines, cursor_lines, fit_code
+from app.tokens import count_tokens
+
+
+def make_module(functions: int = 12, body_lines: int = 40) -> str:
+    parts = ["import os", ""]
+    for i in range(functions):
+        parts.append(f"def func_{i}(value, scale=2):")
+        parts.extend(f"    value = value * scale + {i} + {j}  # step {j}" for j in range(body_lines))
+        parts.extend(["    return value", ""])
+    return "\n".join(parts)
+
+
+def line_of(code: str, text: str) -> int:
+    return code.splitlines().index(text) + 1
+
+
+def test_code_within_budget_is_unchanged():
+    code = make_module(functions=2)
+    assert fit_code(code, budget=10_000) == code
+    assert fit_code("", budget=10) == ""
+
+
+def test_large_file_is_trimmed_to_budget_with_outline():
+    code = make_module()
+    budget = 600
+    out = fit_code(code, budget=budget)
+    assert out != code
+    assert count_tokens(out) <= budget * 1.1
+    assert "def func_11(value, scale=2)" in out  # outline lists functions that were left out
+    assert "생략" in out
+
+
+def test_long_outline_is_cut_at_a_line_boundary():
+    code = make_module(functions=200, body_lines=2)
+    out = fit_code(code, budget=600)
+    outline = out.split("개요:\n", 1)[1].split("\n\n코드:", 1)[0]
+    assert count_tokens(outline) <= 600 // 3
+    assert all(line.startswith("L") for line in outline.splitlines())
+    assert outline.splitlines()[-1].endswith("(value, scale=2)")
+
+
+def test_focus_line_selects_the_surrounding_function():
+    code = make_module()
+    focus = line_of(code, "def func_10(value, scale=2):") + 3
+    out = fit_code(code, budget=600, focus_lines=[focus])
+    assert "    value = value * scale + 10 + 2  # step 2" in out
+    assert "    value = value * scale + 0 + 2  # step 2" not in out
+
+
+def test_function_larger_than_budget_is_windowed_around_focus():
+    code = make_module(functions=3, body_lines=400)
+    focus = line_of(code, "    value = value * scale + 1 + 200  # step 200")
+    out = fit_code(code, budget=500, focus_lines=[focus])
+    assert "    value = value * scale + 1 + 200  # step 200" in out
+    assert "    value = value * scale + 1 + 0  # step 0" not in out
+    assert count_tokens(out) <= 500 * 1.1
+
+
+def test_unparsable_code_falls_back_to_a_line_window():
+    code = "\n".join(f"let x{i} = {i};" for i in range(2000))
+    out = fit_code(code, budget=300, focus_lines=[1000])
+    assert "let x999 = 999;" in out
+    assert "let x0 = 0;" not in out
+    assert count_tokens(out) <= 300 * 1.1
+
+
+def test_changed_lines_reports_new_and_edited_lines():
+    old = "a\nb\nc"
+    assert changed_lines(old, "a\nB\nc\nd") == [2, 4]
+    assert changed_lines(None, "a") == []
+
+
+def test_cursor_lines_are_one_based():
+    assert cursor_lines({"line": 0, "column": 3}) == [1]
+    assert cursor_lines(None) == []
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.ratelimit as ratelimit
+from app.ratelimit import LLMLimiter, TokenBucket, parse_limits
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock; asyncio.sleep advances it instead of waiting."""
+    now = SimpleNamespace(t=1000.0, slept=[])
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        now.slept.append(delay)
+        now.t += delay
+        await real_sleep(0)
+
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: now.t, perf_counter=lambda: now.t))
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    return now
+
+
+def test_full_bucket_does_not_wait(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert asyncio.run(bucket.acquire(60)) == 0.0
+    assert bucket.tokens == 0
+
+
+def test_empty_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(per_minute=60)  # one unit per second
+    asyncio.run(bucket.acquire(60))
+    waited = asyncio.run(bucket.acquire(3))
+    assert waited == pytest.approx(3.0)
+    assert clock.slept == [pytest.approx(3.0)]
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(per_minute=60, capacity=10)
+    asyncio.run(bucket.acquire(10))
+    clock.t += 3600
+    bucket._refill()
+    assert bucket.tokens == 10
+
+
+def test_request_larger_than_capacity_is_clamped(clock):
+    bucket = TokenBucket(per_minute=600)
+    assert asyncio.run(bucket.acquire(10_000)) == 0.0
+    assert bucket.tokens == 0
+
+
+def reserve_and_settle(limiter: LLMLimiter, estimated: int, usage):
+    async def run():
+        async with limiter.reserve(estimated) as permit:
+            permit.settle(usage)
+    asyncio.run(run())
+
+
+def test_settle_charges_underestimates_as_debt(clock):
+    limiter = LLMLimiter(tpm=6000)  # 100 tokens per second
+    reserve_and_settle(limiter, 1000, SimpleNamespace(total_tokens=7000))
+    assert limiter.tokens.tokens == pytest.approx(6000 - 7000)
+    # the next caller waits off the debt plus its own estimate
+    waited = asyncio.run(limiter.tokens.acquire(500))
+    assert waited == pytest.approx(15.0)
+
+
+def test_settle_refunds_overestimates_up_to_capacity(clock):
+    limiter = LLMLimiter(tpm=6000)
+    reserve_and_settle(limiter, 1000, SimpleNamespace(total_tokens=200))
+    assert limiter.tokens.tokens == pytest.approx(5800)
+    limiter.tokens.adjust(-10_000)
+    assert limiter.tokens.tokens == 6000
+
+
+def test_settle_without_usage_keeps_the_estimate(clock):
+    limiter = LLMLimiter(tpm=6000)
+    reserve_and_settle(limiter, 1000, None)
+    assert limiter.tokens.tokens == pytest.approx(5000)
+
+
+def test_rpm_bucket_throttles_requests(clock):
+    limiter = LLMLimiter(rpm=2)  # one request per 30 seconds after the burst
+
+    async def run():
+        for _ in range(3):
+            async with limiter.reserve(10):
+                pass
+    asyncio.run(run())
+    assert limiter.calls == 3
+    assert limiter.throttled_seconds == pytest.approx(30.0)
+
+
+def test_concurrency_cap(clock):
+    limiter = LLMLimiter(max_concurrency=2)
+    peak = []
+
+    async def one(release: asyncio.Event):
+        async with limiter.reserve(10):
+            peak.append(limiter.in_flight)
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(one(release)) for _ in range(3)]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert limiter.in_flight == 2
+        release.set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+    assert max(peak) == 2 and limiter.calls == 3 and limiter.in_flight == 0
+
+
+def test_parse_limits():
+    assert parse_limits(" gpt-4o=120:40000:8 ,mini=600:200000:32,,bad=") == {
+        "gpt-4o": (120, 40000, 8),
+        "mini": (600, 200000, 32),
+    }
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+
+import pytest
+
+import app.resilience as resilience
+from app.resilience import CircuitBreaker, CircuitOpenError, call_with_retries, get_breaker
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_MAX_RETRIES", 0)
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failures):
+        breaker.allow()
+        breaker.record(False)
+
+
+def test_opens_after_consecutive_failures_and_rejects():
+    breaker = CircuitBreaker("t", failures=3, reset=60)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_success_resets_the_streak():
+    breaker = CircuitBreaker("t", failures=2)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed" and breaker.consecutive == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("t", failures=1, reset=0)
+    open_breaker(breaker)
+    breaker.allow()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker("t", failures=1, reset=0)
+    open_breaker(breaker)
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.consecutive == 0
+
+
+def test_release_frees_the_probe_without_a_verdict():
+    breaker = CircuitBreaker("t", failures=1, reset=0)
+    open_breaker(breaker)
+    breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    breaker.allow()  # a new probe is allowed
+
+
+def run(deployment: str, exc: BaseException):
+    async def fail():
+        raise exc
+    with pytest.raises(type(exc)):
+        asyncio.run(call_with_retries(fail, deployment))
+
+
+def new_breaker(**kwargs):
+    deployment = f"test-{uuid.uuid4().hex}"
+    breaker = get_breaker(deployment)
+    for name, value in kwargs.items():
+        setattr(breaker, name, value)
+    return deployment, breaker
+
+
+def test_throttling_and_bad_requests_do_not_reset_the_streak():
+    deployment, breaker = new_breaker(failures=3)
+    for status in (500, 429, 503, 400, 502):
+        run(deployment, StatusError(status))
+    assert breaker.state == "open"
+
+
+def test_own_deadline_does_not_close_a_half_open_breaker():
+    deployment, breaker = new_breaker(failures=1, reset=0)
+    run(deployment, StatusError(500))
+    run(deployment, asyncio.TimeoutError())
+    assert breaker.state == "half_open" and breaker.consecutive == 1
+    assert not breaker._probing
+
+
+def test_success_through_call_with_retries_closes_the_breaker():
+    deployment, breaker = new_breaker(failures=1, reset=0)
+    run(deployment, StatusError(500))
+
+    async def ok():
+        return "ok"
+    assert asyncio.run(call_with_retries(ok, deployment)) == "ok"
+    assert breaker.state == "closed"
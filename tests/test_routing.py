@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import app.routing as routing
+from app.config import AZURE_OPENAI_DEPLOYMENT
+from app.resilience import CircuitOpenError
+from app.routing import LLMRouter, parse_routes
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, deployment, error=None, deltas=("ok",), fail_after=None):
+        self.deployment = deployment
+        self.error = error
+        self.deltas = deltas
+        self.fail_after = fail_after
+        self.calls = 0
+        self.is_mock = False
+
+    def chat(self, messages, system=None, site=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return f"{self.deployment}:{site}"
+
+    async def achat(self, messages, system=None, site=None):
+        return self.chat(messages, system, site)
+
+    async def astream_chat(self, messages, system=None, site=None):
+        self.calls += 1
+        if self.error and self.fail_after is None:
+            raise self.error
+        for i, delta in enumerate(self.deltas):
+            if self.fail_after == i:
+                raise self.error
+            yield delta
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(routing, "get_llm_client", lambda deployment=None: registry[deployment])
+    return registry
+
+
+def test_parse_routes_resolves_aliases_and_dedupes():
+    routes = parse_routes(" classification = gpt-mini | main , report_draft=gpt-4o|gpt-4o|main ")
+    assert routes["classification"] == ["gpt-mini", AZURE_OPENAI_DEPLOYMENT]
+    assert routes["report_draft"] == ["gpt-4o", AZURE_OPENAI_DEPLOYMENT]
+    assert routes["*"] == [AZURE_OPENAI_DEPLOYMENT]
+
+
+def test_parse_routes_skips_malformed_parts():
+    routes = parse_routes("broken,=main,site=,*=backup")
+    assert routes == {"*": ["backup"]}
+
+
+def test_unrouted_site_uses_default_chain():
+    router = LLMRouter({"*": ["primary"], "classification": ["small"]})
+    assert router.chain("classification") == ["small"]
+    assert router.chain("report_draft") == ["primary"]
+    assert router.chain(None) == ["primary"]
+
+
+def test_falls_back_on_open_circuit_and_transient_errors(clients):
+    clients["a"] = FakeClient("a", CircuitOpenError("open"))
+    clients["b"] = FakeClient("b", StatusError(503))
+    clients["c"] = FakeClient("c")
+    router = LLMRouter({"*": ["primary"], "site": ["a", "b", "c"]})
+    assert asyncio.run(router.achat([], site="site")) == "c:site"
+    assert router.chat([], site="site") == "c:site"
+
+
+def test_bad_request_is_not_retried_on_the_fallback(clients):
+    clients["a"] = FakeClient("a", StatusError(400))
+    clients["b"] = FakeClient("b")
+    router = LLMRouter({"*": ["a", "b"]})
+    with pytest.raises(StatusError):
+        asyncio.run(router.achat([], site="site"))
+    assert clients["b"].calls == 0
+
+
+def test_last_deployment_error_is_raised(clients):
+    clients["a"] = FakeClient("a", StatusError(503))
+    clients["b"] = FakeClient("b", StatusError(502))
+    router = LLMRouter({"*": ["a", "b"]})
+    with pytest.raises(StatusError) as info:
+        router.chat([], site="site")
+    assert info.value.status_code == 502
+
+
+def collect(router, site):
+    async def run():
+        return [delta async for delta in router.astream_chat([], site=site)]
+    return asyncio.run(run())
+
+
+def test_stream_falls_back_before_the_first_delta(clients):
+    clients["a"] = FakeClient("a", StatusError(429))
+    clients["b"] = FakeClient("b", deltas=("he", "llo"))
+    router = LLMRouter({"*": ["a", "b"]})
+    assert collect(router, "site") == ["he", "llo"]
+
+
+def test_stream_failing_mid_answer_is_not_replayed(clients):
+    clients["a"] = FakeClient("a", StatusError(503), deltas=("he", "llo"), fail_after=1)
+    clients["b"] = FakeClient("b")
+    router = LLMRouter({"*": ["a", "b"]})
+    with pytest.raises(StatusError):
+        collect(router, "site")
+    assert clients["b"].calls == 0
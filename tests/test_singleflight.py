@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import app.llm as llm
+from app.deadline import bind_deadline, deadline_after
+from app.llm import LLMClient
+
+MESSAGES = [{"role": "user", "content": "explain the calculator"}]
+
+
+class FakeCompletions:
+    """Upstream stand-in: each create() takes `delay` seconds and records the timeout it was given."""
+    def __init__(self, delay: float = 0.2, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.timeouts = []
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))], usage=None)
+
+
+@pytest.fixture
+def client():
+    c = LLMClient(f"test-{uuid.uuid4().hex}")
+    c.is_mock = False
+    c.aclient = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    return c
+
+
+async def call(client: LLMClient, seconds: float | None):
+    bind_deadline(deadline_after(seconds) if seconds else None)
+    try:
+        return await client.achat(MESSAGES, site="test")
+    except Exception as e:
+        return type(e).__name__
+
+
+def test_identical_calls_share_one_upstream_request(client):
+    async def run():
+        return await asyncio.gather(*(call(client, None) for _ in range(5)))
+    assert asyncio.run(run()) == ["answer"] * 5
+    assert len(client.aclient.chat.completions.timeouts) == 1
+    assert llm._inflight == {}
+
+
+def test_follower_outlives_a_leader_with_a_shorter_deadline(client):
+    async def run():
+        return await asyncio.gather(call(client, 0.05), call(client, 5.0))
+    assert asyncio.run(run()) == ["TimeoutError", "answer"]
+    upstream = client.aclient.chat.completions
+    assert len(upstream.timeouts) == 1
+    # the shared request ran on the follower's deadline, not the leader's
+    assert upstream.timeouts[0] > 1.0
+    assert upstream.cancelled == 0
+
+
+def test_request_is_cancelled_when_every_waiter_leaves(client):
+    async def run():
+        results = await asyncio.gather(call(client, 0.05), call(client, 0.08))
+        await asyncio.sleep(0.01)
+        return results
+    assert asyncio.run(run()) == ["TimeoutError", "TimeoutError"]
+    assert client.aclient.chat.completions.cancelled == 1
+    assert llm._inflight == {}
+
+
+def test_new_caller_after_cancellation_starts_a_fresh_request(client):
+    async def run():
+        first = await call(client, 0.05)
+        second = await call(client, 5.0)
+        return first, second
+    assert asyncio.run(run()) == ("TimeoutError", "answer")
+    assert len(client.aclient.chat.completions.timeouts) == 2
+
@@ -1,11 +1,23 @@
+import asyncio
+import threading
 import streamlit as st
 from pathlib import Path
-from app.graph import build_graph
+from app.graph import get_app
 from app.agents.state import AgentState
 from app.config import DATA_DIR, INDEX_DIR, LLM_PROVIDER
 from app.ingest import rebuild_index
 from app.vectorstore.faiss_store import FaissStore
 st.set_page_config(page_title="Agentic AI – Azure OpenAI + Hybrid RAG", layout="wide")
+@st.cache_resource
+def _graph_app():
+    return get_app()
+@st.cache_resource
+def _event_loop():
+    # one loop for the whole UI process: the pooled async LLM connections, limiter locks and
+    # in-flight tasks are bound to the loop they were created on (asyncio.run per click breaks them)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="graph-loop", daemon=True).start()
+    return loop
 st.title("🕹️ Agentic AI – Azure OpenAI + FAISS ⊕ BM25 + Self-Critique + Code Exec")
 st.caption("Upload docs → Rebuild index → Ask. Use prefixes: sql:, python:, java: to execute tools.")
 with st.sidebar:
@@ -45,10 +57,12 @@ if clear:
     st.session_state.pop("result", None)
 run = st.button("▶️ Run Multi-Agent")
 if run and question.strip():
-    sg = build_graph(); app = sg.compile()
+    app = _graph_app()
     state: AgentState = {"question": question}
     with st.spinner("Running graph..."):
-        state = app.invoke(state, config={"recursion_limit": 1})
+        state = asyncio.run_coroutine_threadsafe(
+            app.ainvoke(state, config={"recursion_limit": 10}), _event_loop()
+        ).result()
     st.session_state["result"] = state
 if st.session_state.get("result"):
     R = st.session_state["result"]